@@ -1,6 +1,7 @@
 """Euclidean geometry functions related to hyperbolic geometry."""
 
 import math
+import numpy as np
 from collections import namedtuple
 
 
@@ -61,6 +62,16 @@ def inner_product(v, w):
     return v.x * w.x + v.y * w.y
 
 
+def as_point_array(points):
+    """Convert a list of points to an N-by-2 array of their coordinates."""
+    return np.array(points, dtype=float).reshape(-1, 2)
+
+
+def points_from_array(array):
+    """Convert an N-by-2 array of coordinates to a list of Points."""
+    return [Point(x, y) for (x, y) in array.tolist()]
+
+
 class Line:
     def __init__(self, point, slope):
         self.point = point
@@ -114,6 +125,15 @@ class Line:
         reflection_vector = translated_to_origin - projection
         return projection - reflection_vector + self.point
 
+    def reflect_points(self, points):
+        """Reflect an array of points, whose last axis holds the x and y
+        coordinates (e.g., N-by-2), across this line."""
+        direction = np.array([1, self.slope]) / math.hypot(1, self.slope)
+        translated_to_origin = points - np.array(self.point)
+        signed_lengths = translated_to_origin.dot(direction)
+        projection = signed_lengths[..., np.newaxis] * direction
+        return 2 * projection - translated_to_origin + np.array(self.point)
+
     def __eq__(self, other):
         if not isinstance(other, Line):
             return False
@@ -150,6 +170,13 @@ class VerticalLine(Line):
         """Reflect a point across this line."""
         return Point(2 * self.point.x - point.x, point.y)
 
+    def reflect_points(self, points):
+        """Reflect an array of points across this line, as in
+        Line.reflect_points."""
+        reflected = np.array(points, dtype=float)
+        reflected[..., 0] = 2 * self.point.x - reflected[..., 0]
+        return reflected
+
     def intersect_with(self, line):
         """Compute the point of intersection of this vertical line with another
         line.
@@ -211,6 +238,22 @@ class Circle(namedtuple('Circle', ['center', 'radius'])):
         y_inverted = center.y + radius ** 2 * (y - center.y) / square_norm
         return Point(x_inverted, y_inverted)
 
+    def invert_points(self, points):
+        """Invert an array of points, whose last axis holds the x and y
+        coordinates (e.g., N-by-2), with respect to self.
+
+        Raises a ValueError if any of the points is the center of the circle.
+        """
+        from_center = points - np.array(self.center)
+        square_norms = np.sum(from_center ** 2, axis=-1)
+
+        if np.any(np.sqrt(square_norms) < EPSILON):
+            raise ValueError(
+                "Can't invert the center of a circle in that same circle.")
+
+        scale = self.radius ** 2 / square_norms
+        return np.array(self.center) + scale[..., np.newaxis] * from_center
+
     def intersect_with_line(self, line):
         """Return a possibly empty set containing the points of intersection
         of the context circle and the given line.
@@ -388,10 +431,15 @@ def intersection_of_common_tangents(circle, point1, point2):
     return line1.intersect_with(line2)
 
 
-def bounding_box_area(points):
-    max_x = max(p.x for p in points)
-    max_y = max(p.y for p in points)
-    min_x = min(p.x for p in points)
-    min_y = min(p.y for p in points)
+def centroid(points):
+    """Compute the average of a list (or N-by-2 array) of points."""
+    x, y = np.mean(as_point_array(points), axis=0)
+    return Point(x, y)
 
-    return (max_y - min_y) * (max_x - min_x)
+
+def bounding_box_area(points):
+    """Compute the area of the bounding box of a list (or N-by-2 array) of
+    points."""
+    points = as_point_array(points)
+    width, height = points.max(axis=0) - points.min(axis=0)
+    return width * height
@@ -180,6 +180,20 @@ def test_invert_in_circle_center():
         circle.invert_point(point)
 
 
+def test_invert_points_matches_invert_point():
+    circle = Circle(center=Point(1, -1), radius=3)
+    points = [Point(2, 2), Point(-4, 1), Point(1, 5)]
+    actual = points_from_array(circle.invert_points(as_point_array(points)))
+    assert_iterables_are_close(
+        actual, [circle.invert_point(p) for p in points])
+
+
+def test_invert_points_center():
+    circle = Circle(center=Point(1, 2), radius=2 ** 0.5)
+    with pytest.raises(ValueError):
+        circle.invert_points(as_point_array([Point(3, 3), Point(1, 2)]))
+
+
 def test_circle_through_points_unit_circle():
     reference_circle = Circle(Point(0, 0), 1)
     p1 = Point(1/2, 1/2)
@@ -255,6 +269,25 @@ def test_reflect_decreasing_slope():
     assert_are_close(line.reflect(Point(-2, -3)), Point(0, -1))
 
 
+def test_reflect_points_matches_reflect():
+    points = [Point(2, -2), Point(-6, 4), Point(4, 4), Point(0, 1)]
+    for line in [Line(Point(0, 0), 1), Line(Point(-1, -2), -1),
+                 Line(Point(3, 1), 0), VerticalLine.at_point(Point(2, 5))]:
+        actual = points_from_array(line.reflect_points(as_point_array(points)))
+        assert_iterables_are_close(actual, [line.reflect(p) for p in points])
+
+
+def test_reflect_points_of_several_polygons():
+    line = Line(Point(0, 0), 1)
+    polygons = as_point_array(
+        [Point(2, -2), Point(-6, 4), Point(4, 4), Point(0, 1)]).reshape(2, 2, 2)
+    reflected = line.reflect_points(polygons)
+    assert_that(reflected.shape).is_equal_to((2, 2, 2))
+    assert_iterables_are_close(
+        points_from_array(reflected.reshape(4, 2)),
+        [Point(-2, 2), Point(4, -6), Point(4, 4), Point(1, 0)])
+
+
 def test_circle_intersect_with_vertical_line():
     line = VerticalLine.at_point(Point(math.cos(math.pi / 4), -1))
     circle = Circle(Point(0, 0), 1)
@@ -8,6 +8,7 @@ from geometry import Point
 from geometry import orientation
 from geometry import circle_through_points_perpendicular_to_circle
 import math
+import numpy as np
 
 
 def compute_fundamental_triangle(tessellation_configuration):
@@ -81,6 +82,37 @@ class PoincareDiskLine(Circle):
         """Reflect a point across this line."""
         return self.invert_point(point)
 
+    def reflect_points(self, points):
+        """Reflect an array of points across this line."""
+        return self.invert_points(points)
+
+
+def reflect_across_lines(lines, points):
+    """Reflect an N-by-2 array of points across each of the given lines,
+    returning an array of shape (len(lines), N, 2).
+
+    The reflections across PoincareDiskLines (circle inversions) are all
+    computed in a single vectorized operation, which makes reflecting a
+    polygon across each of its own edges much faster than reflecting each
+    vertex separately.
+    """
+    reflected = np.empty((len(lines),) + points.shape)
+    arcs = [i for (i, line) in enumerate(lines)
+            if isinstance(line, PoincareDiskLine)]
+
+    if arcs:
+        centers = np.array([lines[i].center for i in arcs])[:, np.newaxis, :]
+        radii = np.array([lines[i].radius for i in arcs])[:, np.newaxis]
+        from_center = points[np.newaxis, :, :] - centers
+        scale = radii ** 2 / np.sum(from_center ** 2, axis=-1)
+        reflected[arcs] = centers + scale[..., np.newaxis] * from_center
+
+    for i, line in enumerate(lines):
+        if not isinstance(line, PoincareDiskLine):
+            reflected[i] = line.reflect_points(points)
+
+    return reflected
+
 
 class PoincareDiskModel(Circle):
     def line_through(self, p1, p2):
@@ -95,3 +127,107 @@ class PoincareDiskModel(Circle):
             circle = circle_through_points_perpendicular_to_circle(
                 p1, p2, self)
             return PoincareDiskLine(circle.center, circle.radius)
+
+
+class EdgeMap(object):
+    """A dict whose keys are edges, given as pairs of points (p1, p2). The
+    edge (p1, p2) is the same as (p2, p1), and so is any edge whose
+    endpoints are within TOLERANCE of p1 and p2.
+
+    As in tessellation.PolygonSet, the edges are stored in a spatial hash
+    keyed on their midpoints, with cells TOLERANCE wide, so a matching edge
+    is in the same cell or one of its eight neighbors. Unlike keys made by
+    rounding the endpoints, this never misses an edge whose two copies were
+    computed with slightly different floating point error and round to
+    different values.
+    """
+
+    TOLERANCE = 1e-7
+
+    def __init__(self):
+        self.cells = dict()
+        self.count = 0
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.TOLERANCE), math.floor(y / self.TOLERANCE))
+
+    def _find(self, edge):
+        """Return the list of entries [p1, p2, value] of the cell holding the
+        edge and the index of its entry, or (None, None) if it's missing."""
+        (x1, y1), (x2, y2) = edge
+        cell_x, cell_y = self._cell((x1 + x2) / 2, (y1 + y2) / 2)
+        for i in (cell_x - 1, cell_x, cell_x + 1):
+            for j in (cell_y - 1, cell_y, cell_y + 1):
+                entries = self.cells.get((i, j), ())
+                for index, (q1, q2, _) in enumerate(entries):
+                    for (u, v) in ((q1, q2), (q2, q1)):
+                        if (math.hypot(x1 - u[0], y1 - u[1]) < self.TOLERANCE
+                                and math.hypot(x2 - v[0], y2 - v[1])
+                                < self.TOLERANCE):
+                            return entries, index
+        return None, None
+
+    def get(self, edge, default=None):
+        entries, index = self._find(edge)
+        return default if entries is None else entries[index][2]
+
+    def pop(self, edge, default=None):
+        """Remove an edge and return its value, or return default if the
+        edge is missing."""
+        entries, index = self._find(edge)
+        if entries is None:
+            return default
+        self.count -= 1
+        return entries.pop(index)[2]
+
+    def __contains__(self, edge):
+        return self._find(edge)[0] is not None
+
+    def __setitem__(self, edge, value):
+        entries, index = self._find(edge)
+        if entries is not None:
+            entries[index][2] = value
+            return
+
+        (x1, y1), (x2, y2) = edge
+        cell = self._cell((x1 + x2) / 2, (y1 + y2) / 2)
+        self.cells.setdefault(cell, []).append([edge[0], edge[1], value])
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+
+class LineCache(object):
+    """A cache of the lines through pairs of points in a PoincareDiskModel.
+
+    In a tessellation every edge is shared by two polygons, and the line
+    through an edge is needed both to tessellate and to render each of them.
+    The cache is an EdgeMap, so the line through (p, q) is also used for
+    (q, p).
+    """
+
+    def __init__(self, disk_model):
+        self.disk_model = disk_model
+        self.lines = EdgeMap()
+
+    def line_through(self, p1, p2, store=True, evict=False):
+        """Return the line through two points, as in
+        PoincareDiskModel.line_through, computing it only if it isn't
+        cached. If store is False, a newly computed line isn't cached. If
+        evict is True, a cached line is removed from the cache as it is
+        returned, for lines that are needed at most twice."""
+        if evict:
+            line = self.lines.pop((p1, p2))
+        else:
+            line = self.lines.get((p1, p2))
+        if line is not None:
+            return line
+
+        line = self.disk_model.line_through(p1, p2)
+        if store:
+            self.lines[p1, p2] = line
+        return line
+
+    def __len__(self):
+        return len(self.lines)
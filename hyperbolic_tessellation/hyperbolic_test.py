@@ -1,5 +1,7 @@
 from assertpy import assert_that
 from geometry import Point
+from geometry import as_point_array
+from geometry import points_from_array
 from tessellation import TessellationConfiguration
 import math
 
@@ -27,6 +29,23 @@ def test_poincare_disk_line_reflect():
     assert_are_close(actual_inverse, expected_inverse)
 
 
+def test_reflect_across_lines():
+    model = PoincareDiskModel(Point(0, 0), radius=1)
+    polygon = [Point(1/4, 1/5), Point(1/3, -1/6), Point(-1/5, 1/2)]
+    lines = [
+        model.line_through(Point(1/6, 1/5), Point(2/6, 2/5)),
+        model.line_through(Point(1/2, 0), Point(0, 1/2)),
+        model.line_through(Point(-1/3, 1/4), Point(1/5, 1/3)),
+    ]
+    reflected = reflect_across_lines(lines, as_point_array(polygon))
+
+    assert_that(reflected.shape).is_equal_to((3, 3, 2))
+    for line, reflected_polygon in zip(lines, reflected):
+        assert_iterables_are_close(
+            points_from_array(reflected_polygon),
+            [line.reflect(p) for p in polygon])
+
+
 def test_poincare_disk_model_line_through_diameter():
     model = PoincareDiskModel(Point(0, 0), radius=1)
     p1 = Point(1/6, 1/5)
@@ -43,3 +62,56 @@ def test_poincare_disk_model_line_through_hyperbolic():
     actual_line = model.line_through(p1, p2)
     expected_line = PoincareDiskLine(Point(3/2, 0), (5/4) ** 0.5)
     assert_that(expected_line).is_equal_to(actual_line)
+
+
+def test_line_cache():
+    model = PoincareDiskModel(Point(0, 0), radius=1)
+    cache = LineCache(model)
+    p1, p2 = Point(1/4, 1/5), Point(1/3, -1/6)
+
+    line = cache.line_through(p1, p2)
+    assert_that(line).is_equal_to(model.line_through(p1, p2))
+    assert_that(cache.line_through(p2, p1)).is_same_as(line)
+    assert_that(cache.line_through(p1 + Point(1e-12, 0), p2)).is_same_as(line)
+    assert_that(len(cache)).is_equal_to(1)
+
+    cache.line_through(p1, Point(0, 1/2))
+    assert_that(len(cache)).is_equal_to(2)
+
+
+def test_edge_map():
+    edges = EdgeMap()
+    p1, p2 = Point(1/4, 1/5), Point(1/3, -1/6)
+
+    # copies of an edge that round differently are still the same edge
+    p3, p4 = Point(0.123456749999999, 0), Point(0, 0.5)
+    edges[p3, p4] = 'a'
+    assert_that(edges.get((Point(0.12345675000001, 0), p4))).is_equal_to('a')
+    assert_that((p4, p3) in edges).is_true()
+    assert_that((p1, p2) in edges).is_false()
+
+    edges[p1, p2] = 'b'
+    edges[p2, p1] = 'c'
+    assert_that(len(edges)).is_equal_to(2)
+    assert_that(edges.pop((p1, p2))).is_equal_to('c')
+    assert_that(edges.pop((p1, p2))).is_none()
+    assert_that(len(edges)).is_equal_to(1)
+
+
+def test_line_cache_evict():
+    model = PoincareDiskModel(Point(0, 0), radius=1)
+    cache = LineCache(model)
+    p1, p2 = Point(1/4, 1/5), Point(1/3, -1/6)
+
+    line = cache.line_through(p1, p2, evict=True)
+    assert_that(len(cache)).is_equal_to(1)
+    assert_that(cache.line_through(p2, p1, evict=True)).is_same_as(line)
+    assert_that(len(cache)).is_equal_to(0)
+
+
+def test_line_cache_without_storing():
+    cache = LineCache(PoincareDiskModel(Point(0, 0), radius=1))
+    p1, p2 = Point(1/4, 1/5), Point(1/3, -1/6)
+    line = cache.line_through(p1, p2, store=False)
+    assert_that(len(cache)).is_equal_to(0)
+    assert_that(line).is_equal_to(cache.line_through(p1, p2))
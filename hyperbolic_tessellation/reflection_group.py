@@ -0,0 +1,175 @@
+"""Generate a tessellation of the Poincare disk from its symmetry group.
+
+The symmetries of the {p, q} tessellation form a Coxeter group generated by
+the reflections a, b, c in the sides of the fundamental triangle computed by
+compute_fundamental_triangle:
+
+ - a is the reflection in the x-axis,
+ - b is the reflection in the line through the origin at angle pi / p,
+ - c is the reflection in the circle through the other two vertices.
+
+They satisfy (ab)^p = (bc)^q = (ac)^2 = 1, and no other relations. The
+reflections a and b fix the center polygon, and every other polygon is the
+image of the center polygon under exactly one element w that is shortest in
+its coset w<a, b>. So we can enumerate the polygons by enumerating these
+coset representatives, with no geometric tests for duplicates.
+
+Each group element is stored in two ways:
+
+ - As a (possibly orientation-reversing) Mobius transformation of the
+   complex plane, used to map the center polygon to its image.
+ - As a matrix acting on the three "simple roots" of the Tits
+   representation, used to tell when a word is the shortest one for its
+   element. A product ws is longer than w exactly when w maps the root of s
+   to a positive combination of the simple roots.
+"""
+
+from collections import deque
+from collections import namedtuple
+from geometry import Point
+from hyperbolic import PoincareDiskModel
+from hyperbolic import compute_fundamental_triangle
+import math
+import numpy as np
+
+
+GENERATORS = 'abc'
+
+
+class MobiusTransformation(
+        namedtuple('MobiusTransformation', ['matrix', 'reverses_orientation'])):
+    """The map z -> (alpha z + beta) / (gamma z + delta), where z is replaced by
+    its complex conjugate if reverses_orientation is True, and the matrix is
+    [[alpha, beta], [gamma, delta]].
+    """
+
+    def compose(self, other):
+        """Return the transformation z -> self(other(z))."""
+        other_matrix = other.matrix
+        if self.reverses_orientation:
+            other_matrix = np.conj(other_matrix)
+        return MobiusTransformation(
+            np.dot(self.matrix, other_matrix),
+            self.reverses_orientation != other.reverses_orientation)
+
+    def apply(self, points):
+        """Apply the transformation to an N-by-2 array of points."""
+        z = points[:, 0] + 1j * points[:, 1]
+        if self.reverses_orientation:
+            z = np.conj(z)
+        (alpha, beta), (gamma, delta) = self.matrix
+        image = (alpha * z + beta) / (gamma * z + delta)
+        return np.stack([image.real, image.imag], axis=1)
+
+
+def generator_transformations(configuration):
+    """Return the reflections a, b, c of the fundamental triangle as
+    MobiusTransformations."""
+    p = configuration.num_polygon_sides
+    _, top_vertex, x_axis_vertex = compute_fundamental_triangle(configuration)
+    disk_model = PoincareDiskModel(Point(0, 0), radius=1)
+    edge = disk_model.line_through(top_vertex, x_axis_vertex)
+
+    # inversion in the circle with center g on the x-axis and radius r:
+    # z -> g + r^2 / (conj(z) - g) = (g conj(z) + r^2 - g^2) / (conj(z) - g)
+    g, r = edge.center.x, edge.radius
+    return [
+        MobiusTransformation(np.eye(2, dtype=complex), True),
+        MobiusTransformation(
+            np.array([[np.exp(2j * math.pi / p), 0], [0, 1]]), True),
+        MobiusTransformation(np.array([[g, r ** 2 - g ** 2], [1, -g]]), True),
+    ]
+
+
+def root_reflections(configuration):
+    """Return the matrices of the reflections a, b, c acting on the simple
+    roots of the Tits representation.
+
+    The simple roots are a basis, with the bilinear form
+    B(root_s, root_t) = -cos(pi / m_st), where m_st is the order of st, and
+    the reflection s maps v to v - 2 B(root_s, v) root_s.
+    """
+    p = configuration.num_polygon_sides
+    q = configuration.num_polygons_per_vertex
+    orders = np.array([
+        [1, p, 2],
+        [p, 1, q],
+        [2, q, 1],
+    ])
+    form = -np.cos(math.pi / orders)
+
+    reflections = []
+    for s in range(3):
+        reflection = np.eye(3)
+        reflection[s, :] -= 2 * form[s, :]
+        reflections.append(reflection)
+    return reflections
+
+
+def is_positive(root):
+    """Test whether a root is a positive combination of the simple roots.
+    Every root is either nonnegative or nonpositive in all coordinates."""
+    return np.sum(root) > 0
+
+
+def coset_representatives(configuration, max_depth=None, expand=None):
+    """Generate the shortest element of each coset w<a, b>, shortest first,
+    as pairs (word, transformation).
+
+    The shortest coset representatives form a tree: removing the first letter
+    of a representative's word gives another representative when the word
+    can start with that letter. Making the parent of w the element obtained
+    by removing the alphabetically first such letter gives each element
+    exactly one parent, and we walk the tree breadth-first.
+
+    Arguments:
+        configuration: a TessellationConfiguration
+        max_depth: if not None, skip elements whose word has more than this
+            many c's. The number of c's is the number of polygon edges
+            crossed on the way from the center polygon to w's polygon.
+        expand: if not None, a function of (word, transformation). The
+            elements below those for which it returns False are skipped.
+    """
+    transformations = generator_transformations(configuration)
+    reflections = root_reflections(configuration)
+    identity = MobiusTransformation(np.eye(2, dtype=complex), False)
+
+    # each entry is (word, transformation, roots, inverse_roots), where
+    # roots and inverse_roots are the Tits representation of the element and
+    # its inverse
+    queue = deque([('', identity, np.eye(3), np.eye(3))])
+
+    while queue:
+        word, transformation, roots, inverse_roots = queue.popleft()
+        yield word, transformation
+        if expand is not None and not expand(word, transformation):
+            continue
+
+        for s in range(3):
+            if s == 2 and max_depth is not None \
+                    and word.count('c') >= max_depth:
+                continue
+
+            # s w must be longer than w...
+            if not is_positive(inverse_roots[:, s]):
+                continue
+
+            child_roots = np.dot(reflections[s], roots)
+            child_inverse_roots = np.dot(inverse_roots, reflections[s])
+
+            # ...and still shortest in its coset (s w a and s w b are
+            # longer than s w)...
+            if not (is_positive(child_roots[:, 0])
+                    and is_positive(child_roots[:, 1])):
+                continue
+
+            # ...and s must be the first letter that s w can start with.
+            if any(not is_positive(child_inverse_roots[:, t])
+                   for t in range(s)):
+                continue
+
+            queue.append((
+                GENERATORS[s] + word,
+                transformations[s].compose(transformation),
+                child_roots,
+                child_inverse_roots))
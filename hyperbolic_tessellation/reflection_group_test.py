@@ -0,0 +1,50 @@
+from assertpy import assert_that
+from geometry import Point
+from geometry import as_point_array
+from geometry import points_from_array
+from hyperbolic import compute_fundamental_triangle
+from tessellation import TessellationConfiguration
+import numpy as np
+
+from reflection_group import *
+from testing import *
+
+
+def test_generators_fix_fundamental_triangle_sides():
+    config = TessellationConfiguration(6, 4)
+    center, top_vertex, x_axis_vertex = compute_fundamental_triangle(config)
+    a, b, c = generator_transformations(config)
+
+    def apply(transformation, point):
+        return points_from_array(
+            transformation.apply(as_point_array([point])))[0]
+
+    assert_are_close(apply(a, center), center)
+    assert_are_close(apply(a, x_axis_vertex), x_axis_vertex)
+    assert_are_close(apply(b, center), center)
+    assert_are_close(apply(b, top_vertex), top_vertex)
+    assert_are_close(apply(c, top_vertex), top_vertex)
+    assert_are_close(apply(c, x_axis_vertex), x_axis_vertex)
+    assert_are_close(apply(a, top_vertex), Point(top_vertex.x, -top_vertex.y))
+
+
+def test_root_reflections_satisfy_coxeter_relations():
+    a, b, c = root_reflections(TessellationConfiguration(5, 4))
+    for (s, t, order) in [(a, b, 5), (b, c, 4), (a, c, 2)]:
+        power = np.linalg.matrix_power(np.dot(s, t), order)
+        assert_that(np.allclose(power, np.eye(3))).is_true()
+
+
+def test_coset_representatives_are_distinct_and_short_first():
+    config = TessellationConfiguration(4, 5)
+    words = []
+    for word, _ in coset_representatives(config):
+        words.append(word)
+        if len(words) == 500:
+            break
+
+    assert_that(words[:3]).is_equal_to(['', 'c', 'bc'])
+    assert_that(len(set(words))).is_equal_to(500)
+    assert_that([len(w) for w in words]).is_equal_to(
+        sorted(len(w) for w in words))
+    assert_that(all(w.endswith('c') for w in words[1:])).is_true()
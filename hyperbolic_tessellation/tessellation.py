@@ -2,13 +2,24 @@
 Poincare disk by uniform, regular polygons.
 """
 
+from collections import defaultdict
 from collections import deque
 from collections import namedtuple
 from geometry import Point
+from geometry import as_point_array
+from geometry import bounding_box_area
+from geometry import centroid
 from geometry import orientation
+from geometry import points_from_array
+from hyperbolic import EdgeMap
+from hyperbolic import LineCache
 from hyperbolic import PoincareDiskLine
 from hyperbolic import PoincareDiskModel
 from hyperbolic import compute_fundamental_triangle
+from hyperbolic import reflect_across_lines
+from reflection_group import coset_representatives
+import math
+import numpy as np
 import svgwrite
 
 
@@ -24,30 +35,62 @@ class TessellationConfiguration(
         return (self.num_polygon_sides - 2) * (self.num_polygons_per_vertex - 2) > 4
 
 
-class PolygonSet(set):
+SVG_HEADER = (
+    '<?xml version="1.0" encoding="utf-8" ?>\n'
+    '<svg baseProfile="full" fill="white" fill-opacity="0" height="100%" '
+    'version="1.1" width="100%" xmlns="http://www.w3.org/2000/svg">'
+)
+
+
+class PolygonSet(object):
     """A helper class wrapping a set of polygons, that implements special
     checks for membership and insertion.
 
-    We canonicalize a polygon by rounding its vertex entries, and storing
-    them in a frozenset. All insertion and containment checks are done
-    against the canonicalized input.
+    Each polygon is identified by its centroid (the average of its
+    vertices), since distinct tiles of a tessellation have distinct
+    centroids. The centroids are stored in a spatial hash: a dict from the
+    cell of a square grid containing a centroid to the centroids in that
+    cell. The cells are TOLERANCE wide, so any centroid within TOLERANCE of
+    a given one is in the same cell or one of its eight neighbors. This
+    avoids the false misses of rounding coordinates, where two copies of a
+    polygon computed with slightly different floating point error round to
+    different values.
     """
 
-    PRECISION = 5
+    TOLERANCE = 1e-7
+
+    def __init__(self):
+        self.cells = defaultdict(list)
+        self.count = 0
+
+    def _cell(self, centroid):
+        x, y = centroid
+        return (math.floor(x / self.TOLERANCE), math.floor(y / self.TOLERANCE))
 
-    def _canonicalize(self, points):
-        return frozenset(
-            Point(round(p.x, self.PRECISION), round(p.y, self.PRECISION))
-            for p in points
-        )
+    def add_centroid(self, centroid):
+        self.cells[self._cell(centroid)].append(centroid)
+        self.count += 1
+
+    def contains_centroid(self, centroid):
+        x, y = centroid
+        cell_x, cell_y = self._cell(centroid)
+        for i in (cell_x - 1, cell_x, cell_x + 1):
+            for j in (cell_y - 1, cell_y, cell_y + 1):
+                for (other_x, other_y) in self.cells.get((i, j), ()):
+                    if math.hypot(x - other_x, y - other_y) < self.TOLERANCE:
+                        return True
+        return False
 
     def add_polygon(self, points):
         """Add a polygon to the set."""
-        self.add(self._canonicalize(points))
+        self.add_centroid(centroid(points))
 
     def contains_polygon(self, points):
         """Test if a polygon is in the set."""
-        return self._canonicalize(points) in self
+        return self.contains_centroid(centroid(points))
+
+    def __len__(self):
+        return self.count
 
 
 class RenderedCoords:
@@ -68,6 +111,34 @@ class RenderedCoords:
             return p * self.scaling_factor
 
 
+def check_limits(max_polygon_count, max_depth, canvas_width):
+    if max_polygon_count is None and max_depth is None and canvas_width is None:
+        raise ValueError("A tessellation needs at least one of "
+                         "max_polygon_count, max_depth or canvas_width.")
+
+
+def is_visible(vertices, canvas_width):
+    """Test whether a polygon's Euclidean bounding box covers at least one
+    pixel when the unit disk is rendered canvas_width pixels wide. Every
+    polygon is visible if canvas_width is None."""
+    if canvas_width is None:
+        return True
+    pixel_width = 2 / canvas_width
+    return bounding_box_area(vertices) >= pixel_width ** 2
+
+
+def is_wider_than_pixel(vertices, canvas_width):
+    """Test whether some two vertices of a polygon are at least a pixel apart
+    when rendered at canvas_width. A polygon's bounding box area is at most
+    the square of this distance, and unlike the area it doesn't change when
+    the polygon is rotated."""
+    if canvas_width is None:
+        return True
+    pixel_width = 2 / canvas_width
+    differences = vertices[:, np.newaxis, :] - vertices[np.newaxis, :, :]
+    return np.max(np.sum(differences ** 2, axis=-1)) >= pixel_width ** 2
+
+
 class HyperbolicTessellation(object):
     """A class representing a tessellation in the Poincare disk model.
 
@@ -76,14 +147,51 @@ class HyperbolicTessellation(object):
     of the unit circle.
     """
 
-    def __init__(self, configuration, max_polygon_count=500):
+    def __init__(self, configuration, max_polygon_count=500, generator='bfs',
+                 max_depth=None, canvas_width=None, precompute=True):
+        """Compute the polygons of a tessellation.
+
+        The generator is either 'bfs', to find polygons by repeatedly
+        reflecting polygons across their edges (see tessellate), or 'group',
+        to map the center polygon by the elements of the tessellation's
+        symmetry group (see tessellate_by_group). The limits
+        max_polygon_count, max_depth and canvas_width are passed to the
+        generator.
+
+        If precompute is False, the polygons are not stored in
+        tessellated_polygons, but generated one at a time whenever they are
+        needed (see polygons), and the 'bfs' generator drops each line from
+        line_cache once both polygons on either side of it have used it. Use
+        this with render_streaming to draw tessellations too big to hold in
+        memory.
+        """
+        if generator not in GENERATORS:
+            raise ValueError("Unknown generator {}, expected one of {}".format(
+                generator, GENERATORS))
+
         self.configuration = configuration
         self.disk_model = PoincareDiskModel(Point(0, 0), radius=1)
+        self.line_cache = LineCache(self.disk_model)
 
         # compute the vertices of the center polygon via reflection
         self.center_polygon = self.compute_center_polygon()
-        self.tessellated_polygons = self.tessellate(
-            max_polygon_count=max_polygon_count)
+        check_limits(max_polygon_count, max_depth, canvas_width)
+        self.generator = generator
+        self.limits = dict(
+            max_polygon_count=max_polygon_count, max_depth=max_depth,
+            canvas_width=canvas_width)
+
+        self.precompute = precompute
+        self.tessellated_polygons = None
+        if precompute:
+            self.tessellated_polygons = list(self.polygons())
+
+    def polygons(self):
+        """Return an iterable of the polygons of the tessellation, generating
+        them one at a time if they weren't precomputed."""
+        if self.tessellated_polygons is not None:
+            return self.tessellated_polygons
+        return GENERATORS[self.generator](self, **self.limits)
 
     def compute_center_polygon(self):
         center, top_vertex, x_axis_vertex = compute_fundamental_triangle(
@@ -104,36 +212,130 @@ class HyperbolicTessellation(object):
 
         return polygon
 
-    def tessellate(self, max_polygon_count=500):
+    def tessellate(self, max_polygon_count=500, max_depth=None,
+                   canvas_width=None):
         """Return the set of polygons that make up a tessellation of the center
-        polygon. Keep reflecting polygons until the Euclidean bounding box of all
-        polygons is less than the given threshold.
+        polygon, found by breadth-first search: each polygon's neighbors are
+        its reflections across its edges.
+
+        Arguments:
+            max_polygon_count: stop after this many polygons (plus one).
+            max_depth: if not None, only include polygons at most this many
+                edges away from the center polygon. The search visits whole
+                layers, so no layer is cut off part way around.
+            canvas_width: if not None, leave out polygons whose Euclidean
+                bounding box is smaller than a pixel when rendered at this
+                width, and don't search past polygons narrower than a pixel.
+
+        Any of the limits may be None, but not all of them.
         """
+        return list(self.generate_by_bfs(
+            max_polygon_count, max_depth, canvas_width))
+
+    def generate_by_bfs(self, max_polygon_count=500, max_depth=None,
+                        canvas_width=None):
+        """Generate the polygons returned by tessellate, one at a time."""
+        check_limits(max_polygon_count, max_depth, canvas_width)
         queue = deque()
-        queue.append(self.center_polygon)
-        tessellated_polygons = []
-        processed = PolygonSet()
+        queue.append((as_point_array(self.center_polygon), 0))
+        polygon_count = 0
+
+        # polygons are added when they are first reached, so that each
+        # polygon is queued once instead of once per neighbor
+        discovered = PolygonSet()
+        discovered.add_polygon(self.center_polygon)
 
         while queue:
-            polygon = queue.popleft()
-            if processed.contains_polygon(polygon):
+            vertices, depth = queue.popleft()
+            polygon = points_from_array(vertices)
+            expand = max_depth is None or depth < max_depth
+
+            if expand:
+                # Compute the lines before yielding the polygon, so that
+                # render_streaming finds them in the cache. Without
+                # precomputing, nothing renders from the cache afterwards,
+                # so each line is dropped once the polygons on both of its
+                # sides have been expanded.
+                edges = [(polygon[i], polygon[(i + 1) % len(polygon)])
+                         for i in range(len(polygon))]
+                lines = [self.line_cache.line_through(
+                    u, v, evict=not self.precompute) for (u, v) in edges]
+
+            if is_visible(vertices, canvas_width):
+                yield polygon
+                polygon_count += 1
+                if (max_polygon_count is not None
+                        and polygon_count > max_polygon_count):
+                    break
+            if not expand:
                 continue
 
-            edges = [(polygon[i], polygon[(i + 1) % len(polygon)])
-                     for i in range(len(polygon))]
-            for u, v in edges:
-                line = self.disk_model.line_through(u, v)
-                reflected_polygon = [line.reflect(p) for p in polygon]
-                queue.append(reflected_polygon)
-
-            tessellated_polygons.append(polygon)
-            processed.add_polygon(polygon)
-            if len(processed) > max_polygon_count:
-                processed.add_polygon(polygon)
+            reflected_polygons = reflect_across_lines(lines, vertices)
+            centroids = reflected_polygons.mean(axis=1).tolist()
+
+            for reflected_polygon, reflected_centroid in zip(
+                    reflected_polygons, centroids):
+                if discovered.contains_centroid(reflected_centroid):
+                    continue
+                discovered.add_centroid(reflected_centroid)
+                if is_wider_than_pixel(reflected_polygon, canvas_width):
+                    queue.append((reflected_polygon, depth + 1))
+
+    def tessellate_by_group(self, max_polygon_count=500, max_depth=None,
+                            canvas_width=None):
+        """Return the polygons of a tessellation, as in tessellate, computed
+        as the images of the center polygon under the shortest
+        representatives of the cosets of its symmetry group (see
+        reflection_group.py). Each polygon is computed once, and no edges
+        are computed at all.
+
+        The limits are as in tessellate. Polygons are produced in order of
+        the length of their group element rather than their depth, but every
+        polygon within max_depth is included unless max_polygon_count is
+        reached first.
+
+        Going down the group's tree either rotates a polygon about the
+        origin or inverts it in a circle it lies outside of, so it never
+        moves two vertices further apart. So once a polygon is narrower than
+        a pixel, the whole subtree below it can be skipped.
+        """
+        return list(self.generate_by_group(
+            max_polygon_count, max_depth, canvas_width))
+
+    def generate_by_group(self, max_polygon_count=500, max_depth=None,
+                          canvas_width=None):
+        """Generate the polygons returned by tessellate_by_group, one at a
+        time."""
+        check_limits(max_polygon_count, max_depth, canvas_width)
+        center_vertices = as_point_array(self.center_polygon)
+        polygon_count = 0
+        # each polygon is needed twice, to output it and to decide whether
+        # to expand it, so keep the most recent one
+        images = dict()
+
+        def image(word, transformation):
+            if word not in images:
+                images.clear()
+                images[word] = transformation.apply(center_vertices)
+            return images[word]
+
+        def expand(word, transformation):
+            return is_wider_than_pixel(
+                image(word, transformation), canvas_width)
+
+        representatives = coset_representatives(
+            self.configuration, max_depth=max_depth,
+            expand=None if canvas_width is None else expand)
+        for word, transformation in representatives:
+            vertices = image(word, transformation)
+            if not is_visible(vertices, canvas_width):
+                continue
+            yield points_from_array(vertices)
+            polygon_count += 1
+            if (max_polygon_count is not None
+                    and polygon_count > max_polygon_count):
                 break
 
-        return tessellated_polygons
-
     def render(self, filename, canvas_width):
         """Output an svg file drawing the tessellation."""
         self.transformer = RenderedCoords(canvas_width)
@@ -151,11 +353,78 @@ class HyperbolicTessellation(object):
 
         polygon_group = self.dwg.add(self.dwg.g(
             id='polygons', stroke='blue', stroke_width=1))
-        for polygon in self.tessellated_polygons:
+        for polygon in self.polygons():
             self.render_polygon(polygon, polygon_group)
 
         self.dwg.save()
 
+    def render_streaming(self, filename, canvas_width, single_path=False):
+        """Output an svg file drawing the tessellation, like render, but
+        write each edge to the file as soon as its polygon is generated
+        instead of building the whole drawing in memory first.
+
+        Each edge is shared by two polygons, and is only drawn the first
+        time. An edge is forgotten once its second polygon has been seen, so
+        only the edges on the frontier of the polygons generated so far are
+        remembered. If the polygons weren't precomputed, the same goes for
+        the lines the 'bfs' generator keeps in line_cache.
+
+        If single_path is True, draw all the edges as one svg path element,
+        which makes a smaller file.
+        """
+        transformer = RenderedCoords(canvas_width)
+        center = transformer.in_rendered_coords(self.disk_model.center)
+        radius = transformer.in_rendered_coords(self.disk_model.radius)
+        edges_seen_once = EdgeMap()
+
+        with open(filename, 'w') as outfile:
+            outfile.write(SVG_HEADER)
+            outfile.write(
+                '<circle cx="{}" cy="{}" r="{}" fill="white" fill-opacity="0" '
+                'id="boundary_circle" stroke="black" stroke-width="1" />'
+                .format(center.x, center.y, radius))
+            outfile.write('<g id="polygons" stroke="blue" stroke-width="1">')
+            if single_path:
+                outfile.write('<path d="')
+
+            for polygon in self.polygons():
+                edges = [(polygon[i], polygon[(i + 1) % len(polygon)])
+                         for i in range(len(polygon))]
+                for (p, q) in edges:
+                    if edges_seen_once.pop((p, q)) is not None:
+                        continue
+                    edges_seen_once[p, q] = True
+
+                    path_data = self.edge_path_data(p, q, transformer)
+                    if single_path:
+                        outfile.write(path_data + ' ')
+                    else:
+                        outfile.write('<path d="{}" />'.format(path_data))
+
+            if single_path:
+                outfile.write('" />')
+            outfile.write('</g></svg>\n')
+
+    def edge_path_data(self, p, q, transformer):
+        """Return the svg path data drawing the edge from p to q: an arc, or
+        a straight line if the edge lies on a diameter.
+
+        Lines already cached by the generator are reused. The 'bfs'
+        generator computes the lines of a polygon it will expand before
+        yielding it, so a line missing from the cache is only needed here,
+        and isn't added to the cache.
+        """
+        line = self.line_cache.line_through(p, q, store=False)
+        start = transformer.in_rendered_coords(p)
+        end = transformer.in_rendered_coords(q)
+        if not isinstance(line, PoincareDiskLine):
+            return 'M {} {} L {} {}'.format(start.x, start.y, end.x, end.y)
+
+        sweep = orientation(p, q, self.disk_model.center) == 'counterclockwise'
+        r = transformer.in_rendered_coords(line.radius)
+        return 'M {} {} A {} {} 0 0,{} {} {}'.format(
+            start.x, start.y, r, r, int(sweep), end.x, end.y)
+
     def render_polygon(self, polygon, group):
         arcs_group = group.add(self.dwg.g())
 
@@ -163,7 +432,7 @@ class HyperbolicTessellation(object):
                  for i in range(len(polygon))]
 
         for (p, q) in edges:
-            line = self.disk_model.line_through(p, q)
+            line = self.line_cache.line_through(p, q)
             if isinstance(line, PoincareDiskLine):
                 self.render_arc(arcs_group, line, p, q)
             else:
@@ -191,3 +460,9 @@ class HyperbolicTessellation(object):
             absolute=True)
 
         group.add(path)
+
+
+GENERATORS = {
+    'bfs': HyperbolicTessellation.generate_by_bfs,
+    'group': HyperbolicTessellation.generate_by_group,
+}
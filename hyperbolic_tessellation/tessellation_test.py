@@ -1,7 +1,14 @@
+from assertpy import assert_that
 from geometry import Point
+from geometry import bounding_box_area
 from geometry import rotate_around_origin
+from hyperbolic import EdgeMap
+from xml.etree import ElementTree
 import math
+import os
 import pytest
+import shutil
+import tempfile
 
 from tessellation import *
 from testing import *
@@ -33,3 +40,167 @@ def test_center_polygon():
     ]
 
     assert_iterables_are_close(tessellation.compute_center_polygon(), vertices)
+
+
+def test_polygon_set():
+    polygons = PolygonSet()
+    square = [Point(0, 0), Point(1, 0), Point(1, 1), Point(0, 1)]
+    polygons.add_polygon(square)
+
+    nudged = [p + Point(1e-9, -1e-9) for p in reversed(square)]
+    assert_that(polygons.contains_polygon(nudged)).is_true()
+    shifted = [p + Point(1e-3, 0) for p in square]
+    assert_that(polygons.contains_polygon(shifted)).is_false()
+    assert_that(len(polygons)).is_equal_to(1)
+
+
+def test_tessellation_has_no_duplicate_polygons():
+    config = TessellationConfiguration(4, 5)
+    tessellation = HyperbolicTessellation(config, max_polygon_count=300)
+    polygons = PolygonSet()
+
+    for polygon in tessellation.tessellated_polygons:
+        assert_that(polygons.contains_polygon(polygon)).is_false()
+        polygons.add_polygon(polygon)
+    assert_that(len(polygons)).is_equal_to(301)
+
+
+def test_group_generator_matches_bfs():
+    config = TessellationConfiguration(3, 7)
+    bfs = HyperbolicTessellation(config, max_polygon_count=1000)
+    group = HyperbolicTessellation(
+        config, max_polygon_count=200, generator='group')
+    bfs_polygons = PolygonSet()
+    for polygon in bfs.tessellated_polygons:
+        bfs_polygons.add_polygon(polygon)
+
+    group_polygons = PolygonSet()
+    for polygon in group.tessellated_polygons:
+        assert_that(bfs_polygons.contains_polygon(polygon)).is_true()
+        assert_that(group_polygons.contains_polygon(polygon)).is_false()
+        group_polygons.add_polygon(polygon)
+    assert_that(len(group_polygons)).is_equal_to(201)
+
+
+def test_unknown_generator():
+    with pytest.raises(ValueError):
+        HyperbolicTessellation(TessellationConfiguration(6, 4), generator='dfs')
+
+
+def test_max_depth_includes_whole_layers():
+    config = TessellationConfiguration(4, 5)
+    for generator in ['bfs', 'group']:
+        # the center polygon and its 4 neighbors across an edge
+        tessellation = HyperbolicTessellation(
+            config, max_polygon_count=None, max_depth=1, generator=generator)
+        assert_that(tessellation.tessellated_polygons).is_length(5)
+
+
+def test_canvas_width_prunes_small_polygons():
+    config = TessellationConfiguration(6, 4)
+    canvas_width = 200
+    for generator in ['bfs', 'group']:
+        tessellation = HyperbolicTessellation(
+            config, max_polygon_count=None, canvas_width=canvas_width,
+            generator=generator)
+        for polygon in tessellation.tessellated_polygons:
+            assert_that(bounding_box_area(polygon)).is_greater_than_or_equal_to(
+                (2 / canvas_width) ** 2)
+
+    coarse = HyperbolicTessellation(
+        config, max_polygon_count=None, canvas_width=100)
+    fine = HyperbolicTessellation(
+        config, max_polygon_count=None, canvas_width=1000)
+    assert_that(len(coarse.tessellated_polygons)).is_less_than(
+        len(fine.tessellated_polygons))
+
+
+def test_tessellation_needs_a_limit():
+    with pytest.raises(ValueError):
+        HyperbolicTessellation(
+            TessellationConfiguration(6, 4), max_polygon_count=None)
+
+
+def test_bfs_without_precompute_keeps_only_frontier_lines():
+    config = TessellationConfiguration(4, 5)
+    tessellation = HyperbolicTessellation(
+        config, max_polygon_count=None, max_depth=3, precompute=False)
+    all_polygons = list(tessellation.polygons())
+    inner_polygons = HyperbolicTessellation(
+        config, max_polygon_count=None, max_depth=2).tessellated_polygons
+
+    def polygon_edges(polygons):
+        return [(p, q) for polygon in polygons
+                for (p, q) in zip(polygon, polygon[1:] + polygon[:1])]
+
+    def edge_counts(polygons):
+        counts = EdgeMap()
+        for edge in polygon_edges(polygons):
+            counts[edge] = counts.get(edge, 0) + 1
+        return counts
+
+    # only the polygons at depth 2 or less are expanded, so the lines left
+    # are those between a polygon at depth 2 and one at depth 3
+    inner_counts = edge_counts(inner_polygons)
+    all_counts = edge_counts(all_polygons)
+    frontier_edges = [
+        edge for edge in polygon_edges(inner_polygons)
+        if inner_counts.get(edge) == 1 and all_counts.get(edge) == 2]
+    assert_that(len(tessellation.line_cache)).is_equal_to(len(frontier_edges))
+
+
+def test_render_streaming_computes_each_line_once(monkeypatch):
+    tessellation = HyperbolicTessellation(
+        TessellationConfiguration(4, 5), max_polygon_count=None, max_depth=4,
+        precompute=False)
+    line_through = tessellation.disk_model.line_through
+    calls = []
+
+    def counted_line_through(p1, p2):
+        calls.append((p1, p2))
+        return line_through(p1, p2)
+
+    monkeypatch.setattr(
+        tessellation.disk_model, 'line_through', counted_line_through)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        tessellation.render_streaming(
+            os.path.join(tmpdir, 'tessellation.svg'), canvas_width=500)
+    finally:
+        shutil.rmtree(tmpdir)
+    rendering_calls = len(calls)
+
+    edges = EdgeMap()
+    for polygon in tessellation.polygons():
+        for (p, q) in zip(polygon, polygon[1:] + polygon[:1]):
+            edges[p, q] = True
+    assert_that(rendering_calls).is_equal_to(len(edges))
+
+
+def test_render_streaming_draws_each_edge_once():
+    config = TessellationConfiguration(4, 5)
+    tessellation = HyperbolicTessellation(
+        config, max_polygon_count=None, max_depth=2, precompute=False)
+    svg = '{http://www.w3.org/2000/svg}'
+    tmpdir = tempfile.mkdtemp()
+
+    try:
+        filename = os.path.join(tmpdir, 'tessellation.svg')
+        tessellation.render_streaming(filename, canvas_width=500)
+        paths = ElementTree.parse(filename).getroot().iter(svg + 'path')
+        path_data = [path.get('d') for path in paths]
+
+        edges = EdgeMap()
+        for polygon in tessellation.polygons():
+            for (p, q) in zip(polygon, polygon[1:] + polygon[:1]):
+                edges[p, q] = True
+        assert_that(path_data).is_length(len(edges))
+        assert_that(len(set(path_data))).is_equal_to(len(path_data))
+
+        tessellation.render_streaming(
+            filename, canvas_width=500, single_path=True)
+        paths = list(ElementTree.parse(filename).getroot().iter(svg + 'path'))
+        assert_that(paths).is_length(1)
+        assert_that(paths[0].get('d').count('M')).is_equal_to(len(edges))
+    finally:
+        shutil.rmtree(tmpdir)
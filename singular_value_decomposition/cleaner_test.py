@@ -0,0 +1,162 @@
+from assertpy import assert_that
+import io
+import json
+import os
+import pytest
+import shutil
+import tempfile
+
+from data import cleaner
+
+
+def write_stories(directory, stories):
+    for filename, text in stories.items():
+        with open(os.path.join(directory, filename), 'w') as outfile:
+            outfile.write(text)
+
+
+# Stand-ins for the NLTK-based cleaning, run in the worker processes.
+def fake_init_worker(*args):
+    pass
+
+
+def clean_in_first_run(item):
+    filename, text = item
+    return {'filename': filename, 'text': text, 'words': ['first']}, []
+
+
+def clean_in_second_run(item):
+    filename, text = item
+    return {'filename': filename, 'text': text, 'words': ['second']}, []
+
+
+def failing_clean_document(item):
+    raise ValueError("cleaning failed")
+
+
+class FakeCache(object):
+    def __init__(self):
+        self.entries = []
+
+    def update(self, entries):
+        self.entries.extend(entries)
+
+
+def test_plan_cleaning():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_stories(tmpdir, {
+            'same.txt': 'unchanged story',
+            'touched.txt': 'same text, new mtime',
+            'changed.txt': 'new text',
+            'new.txt': 'a new story',
+            'notes.md': 'not a story',
+        })
+        plan = cleaner.planCleaning(tmpdir, dict())
+        previousFiles = dict(
+            (filename, dict(info, offset=0, length=1))
+            for (filename, info, _) in plan)
+
+        os.utime(os.path.join(tmpdir, 'touched.txt'), (0, 0))
+        write_stories(tmpdir, {'changed.txt': 'new text, longer'})
+        del previousFiles['new.txt']
+        plan = cleaner.planCleaning(tmpdir, previousFiles)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    reused = dict((filename, previous is not None)
+                  for (filename, _, previous) in plan)
+    assert_that(reused).is_equal_to({
+        'changed.txt': False,
+        'new.txt': False,
+        'same.txt': True,
+        'touched.txt': True,
+    })
+
+
+def test_records():
+    previousOutput = io.BytesIO(b'[{"old": 1}, {"old": 2}]')
+    plan = [
+        ('a.txt', {}, {'offset': 13, 'length': 10}),
+        ('b.txt', {}, None),
+        ('c.txt', {}, {'offset': 1, 'length': 10}),
+    ]
+    results = iter([({'new': 3}, [('word', 'n', 'lemma')])])
+    cache = FakeCache()
+
+    actual = list(cleaner.records(plan, results, previousOutput, cache))
+    assert_that(actual).is_equal_to(
+        ['{"old": 2}', '{"new": 3}', '{"old": 1}'])
+    assert_that(cache.entries).is_equal_to([('word', 'n', 'lemma')])
+
+
+def test_manifest_is_ignored_when_the_output_changes():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        outputPath = os.path.join(tmpdir, 'out.json')
+        manifestPath = outputPath + '.manifest'
+        with open(outputPath, 'w') as outfile:
+            outfile.write('[{"a": 1}]')
+
+        files = {'a.txt': {'offset': 1, 'length': 8}}
+        cleaner.saveManifest(manifestPath, outputPath, files)
+        assert_that(cleaner.loadManifest(manifestPath, outputPath)).is_equal_to(
+            files)
+        assert_that(os.listdir(tmpdir)).contains_only(
+            'out.json', 'out.json.manifest')
+
+        # a run that replaced the output but died before saving the manifest
+        with open(outputPath, 'w') as outfile:
+            outfile.write('[{"b": 1}]')
+        assert_that(cleaner.loadManifest(manifestPath, outputPath)).is_empty()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_process_only_cleans_new_or_changed_stories(monkeypatch):
+    monkeypatch.setattr(cleaner, 'initWorker', fake_init_worker)
+    tmpdir = tempfile.mkdtemp()
+    stories = os.path.join(tmpdir, 'stories')
+    os.mkdir(stories)
+    outputPath = os.path.join(tmpdir, 'out.jsonl')
+
+    def run(cleanDocument):
+        monkeypatch.setattr(cleaner, 'cleanDocument', cleanDocument)
+        cleaner.process(
+            output_filename=outputPath, processes=1, lemmaCacheFilename=None,
+            storiesDirectory=stories)
+        with open(outputPath, 'r') as infile:
+            return [json.loads(line) for line in infile]
+
+    try:
+        write_stories(stories, {'a.txt': 'first story', 'b.txt': 'second'})
+        run(clean_in_first_run)
+        write_stories(stories, {'b.txt': 'second, edited', 'c.txt': 'third'})
+        documents = run(clean_in_second_run)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    assert_that(documents).is_equal_to([
+        {'filename': 'a.txt', 'text': 'first story', 'words': ['first']},
+        {'filename': 'b.txt', 'text': 'second, edited', 'words': ['second']},
+        {'filename': 'c.txt', 'text': 'third', 'words': ['second']},
+    ])
+
+
+def test_process_removes_partial_output_when_a_worker_fails(monkeypatch):
+    monkeypatch.setattr(cleaner, 'initWorker', fake_init_worker)
+    monkeypatch.setattr(cleaner, 'cleanDocument', failing_clean_document)
+    tmpdir = tempfile.mkdtemp()
+    stories = os.path.join(tmpdir, 'stories')
+    os.mkdir(stories)
+
+    try:
+        write_stories(stories, {'a.txt': 'first story'})
+        with pytest.raises(ValueError):
+            cleaner.process(
+                output_filename=os.path.join(tmpdir, 'out.json'),
+                processes=1, lemmaCacheFilename=None,
+                storiesDirectory=stories)
+        assert_that(os.listdir(tmpdir)).contains_only('stories')
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,198 @@
+'''k-means clustering for the projected words and documents of the topic
+model.
+
+Centers are seeded with k-means++, the best of several restarts can be kept
+(the restarts run in parallel threads; NumPy releases the GIL for the
+heavy lifting), and large inputs can be clustered with mini-batch k-means.
+'''
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+def nearest_centers(vectors, centers, transposed=None):
+    '''Return the index of the center nearest to each vector. transposed,
+    if given, is a C-contiguous copy of vectors.T.
+
+    The squared norm of the vector is the same for every center, so it is
+    left out of the comparison. There are few centers and many vectors, so
+    a running minimum over the centers is faster than np.argmin along rows.
+    '''
+    if transposed is None:
+        transposed = vectors.T
+    scores = np.dot(centers, transposed)
+    scores *= -2
+    scores += np.einsum('ij,ij->i', centers, centers)[:, np.newaxis]
+
+    best = scores[0].copy()
+    labels = np.zeros(len(best), dtype=np.intp)
+    for j in range(1, len(scores)):
+        np.putmask(labels, scores[j] < best, j)
+        np.minimum(best, scores[j], out=best)
+    return labels
+
+
+def kmeans_plus_plus(vectors, k, random_state):
+    '''Choose k initial centers from the input vectors using k-means++
+    seeding: each new center is chosen with probability proportional to its
+    squared distance from the nearest center chosen so far.'''
+    n = len(vectors)
+    vector_norms = np.einsum('ij,ij->i', vectors, vectors)
+
+    def squared_distances(center):
+        return np.maximum(
+            vector_norms - 2 * np.dot(vectors, center) + np.dot(center, center),
+            0)
+
+    centers = [vectors[random_state.randint(n)]]
+    closest = squared_distances(centers[0])
+
+    for _ in range(1, k):
+        cumulative = np.cumsum(closest)
+        total = cumulative[-1]
+        if total > 0:
+            index = min(np.searchsorted(
+                cumulative, random_state.uniform(0, total), side='right'), n - 1)
+        else:
+            index = random_state.randint(n)
+        centers.append(vectors[index])
+        np.minimum(closest, squared_distances(vectors[index]), out=closest)
+
+    return np.array(centers, dtype=float)
+
+
+def cluster_sums(vectors, labels, k, transposed=None):
+    '''Return the k-by-d matrix whose row j is the sum of the vectors with
+    label j. transposed, if given, is a C-contiguous copy of vectors.T,
+    which makes the per-coordinate sums faster.'''
+    if transposed is None:
+        transposed = np.ascontiguousarray(vectors.T)
+    return np.stack([
+        np.bincount(labels, weights=coordinates, minlength=k)
+        for coordinates in transposed
+    ], axis=1)
+
+
+def lloyd(vectors, centers, max_iterations=10, tolerance=1e-4):
+    '''Run Lloyd's algorithm from the given initial centers, stopping when
+    the total squared movement of the centers is at most tolerance times
+    the total variance of the vectors (as in scikit-learn), so the stopping
+    point doesn't depend on the scale of the vectors.
+
+    Returns:
+        A tuple (centers, labels, inertia), where inertia is the sum of the
+        squared distances from each vector to its center.
+    '''
+    k = len(centers)
+    transposed = np.ascontiguousarray(vectors.T)
+    threshold = tolerance * np.sum(np.var(transposed, axis=1))
+    for _ in range(max_iterations):
+        labels = nearest_centers(vectors, centers, transposed)
+        counts = np.bincount(labels, minlength=k)
+        sums = cluster_sums(vectors, labels, k, transposed)
+
+        # an empty cluster keeps its old center
+        nonempty = counts > 0
+        new_centers = centers.copy()
+        new_centers[nonempty] = sums[nonempty] / counts[nonempty, np.newaxis]
+
+        shift = np.sum((new_centers - centers) ** 2)
+        centers = new_centers
+        if shift <= threshold:
+            break
+
+    labels = nearest_centers(vectors, centers, transposed)
+    inertia = np.sum((vectors - centers[labels]) ** 2)
+    return centers, labels, inertia
+
+
+def kmeans(vectors, k, restarts=4, workers=None, max_iterations=10,
+           tolerance=1e-4):
+    '''Cluster the rows of vectors into k clusters with k-means.
+
+    Arguments:
+        vectors: an n-by-d array
+        k: the number of clusters
+        restarts: the number of k-means++ seeded runs of Lloyd's algorithm.
+            The run with the smallest inertia is returned, so the result
+            depends less on the random seeds.
+        workers: the number of threads to run restarts in, if there is more
+            than one. If None, use the ThreadPoolExecutor default.
+        max_iterations, tolerance: passed to lloyd. The default cap of 10
+            iterations matches scipy.cluster.vq.kmeans2; k-means++ seeding
+            starts closer to a good clustering than kmeans2's random one.
+
+    Returns:
+        A pair (centers, labels), as in scipy.cluster.vq.kmeans2.
+    '''
+    vectors = np.asarray(vectors, dtype=float)
+    k = min(k, len(vectors))
+    seeds = np.random.randint(2 ** 31 - 1, size=restarts)
+
+    def run(seed):
+        random_state = np.random.RandomState(seed)
+        centers = kmeans_plus_plus(vectors, k, random_state)
+        return lloyd(vectors, centers, max_iterations=max_iterations,
+                     tolerance=tolerance)
+
+    if restarts == 1:
+        runs = [run(seeds[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            runs = list(executor.map(run, seeds))
+
+    centers, labels, _ = min(runs, key=lambda result: result[2])
+    return centers, labels
+
+
+def minibatch_kmeans(vectors, k, batch_size=1024, iterations=100):
+    '''Cluster the rows of vectors into k clusters with mini-batch k-means:
+    each iteration moves the centers towards a small random sample of the
+    vectors, keeping each center at the mean of all the sampled points that
+    have been assigned to it. Each iteration costs O(batch_size * k) rather
+    than O(n * k).
+
+    Returns:
+        A pair (centers, labels), as in kmeans.
+    '''
+    vectors = np.asarray(vectors, dtype=float)
+    n = len(vectors)
+    k = min(k, n)
+    random_state = np.random.RandomState(np.random.randint(2 ** 31 - 1))
+
+    sample = vectors[random_state.choice(n, min(n, 10 * batch_size), replace=False)]
+    centers = kmeans_plus_plus(sample, k, random_state)
+    counts = np.zeros(k)
+
+    for _ in range(iterations):
+        batch = vectors[random_state.randint(n, size=min(batch_size, n))]
+        labels = nearest_centers(batch, centers)
+        batch_counts = np.bincount(labels, minlength=k)
+        batch_sums = cluster_sums(batch, labels, k)
+
+        # move each center to the running mean of the points assigned to it
+        updated = batch_counts > 0
+        counts += batch_counts
+        centers[updated] += (
+            batch_sums[updated]
+            - batch_counts[updated, np.newaxis] * centers[updated]
+        ) / counts[updated, np.newaxis]
+
+    labels = nearest_centers(vectors, centers)
+    return centers, labels
+
+
+def group_by_label(labels, item):
+    '''Group items by their cluster labels in a single pass.
+
+    Arguments:
+        labels: a list of cluster labels, one per index
+        item: a function mapping an index to the item to put in its cluster
+
+    Returns:
+        A tuple of clusters, each a tuple of items, ordered by label. Labels
+        with no items produce no cluster.
+    '''
+    groups = dict()
+    for i, label in enumerate(labels):
+        groups.setdefault(label, []).append(item(i))
+    return tuple(tuple(groups[label]) for label in sorted(groups))
@@ -0,0 +1,41 @@
+from assertpy import assert_that
+import numpy
+
+from clustering import group_by_label
+from clustering import kmeans
+from clustering import minibatch_kmeans
+
+
+def blobs():
+    numpy.random.seed(1)
+    centers = numpy.array([[0, 0], [10, 0], [0, 10]])
+    vectors = numpy.vstack([
+        center + numpy.random.standard_normal((50, 2)) for center in centers
+    ])
+    return vectors, numpy.repeat([0, 1, 2], 50)
+
+
+def assert_same_clustering(labels, expected_labels):
+    groups = set(group_by_label(labels, lambda i: i))
+    expected_groups = set(group_by_label(expected_labels, lambda i: i))
+    assert_that(groups).is_equal_to(expected_groups)
+
+
+def test_group_by_label():
+    labels = [2, 0, 2, 1, 0]
+    assert_that(group_by_label(labels, lambda i: 'abcde'[i])).is_equal_to(
+        (('b', 'e'), ('d',), ('a', 'c')))
+
+
+def test_kmeans():
+    vectors, expected_labels = blobs()
+    centers, labels = kmeans(vectors, 3, restarts=4)
+    assert_that(centers.shape).is_equal_to((3, 2))
+    assert_same_clustering(labels, expected_labels)
+
+
+def test_minibatch_kmeans():
+    vectors, expected_labels = blobs()
+    centers, labels = minibatch_kmeans(vectors, 3, batch_size=32)
+    assert_that(centers.shape).is_equal_to((3, 2))
+    assert_same_clustering(labels, expected_labels)
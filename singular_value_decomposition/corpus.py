@@ -0,0 +1,176 @@
+'''A compact on-disk format for a corpus of cleaned documents.
+
+A corpus is stored as a directory containing
+
+    vocabulary.txt: the distinct words, one per line. Word i is on line i.
+    token_ids.npy: the words of all documents, concatenated, as word ids.
+    document_offsets.npy: document j's words are
+        token_ids[document_offsets[j]:document_offsets[j + 1]].
+    filenames.txt: the filename of each document, one per line.
+    texts.txt: the texts of all documents, concatenated.
+    text_offsets.npy: document j's text is bytes
+        text_offsets[j]:text_offsets[j + 1] of texts.txt.
+
+The arrays are memory-mapped when loaded, and texts are only read when asked
+for, so loading a corpus costs little more than reading its vocabulary.
+'''
+import json
+import numpy as np
+import os
+import sys
+from array import array
+from scipy.sparse import csr_matrix
+
+
+class CorpusWriter(object):
+    '''Write a corpus to a directory one document at a time.'''
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.word_to_id = dict()
+        self.token_ids = array('i')
+        self.document_offsets = array('q', [0])
+        self.text_offsets = array('q', [0])
+        self.filenames = open(os.path.join(directory, 'filenames.txt'), 'w')
+        self.texts = open(os.path.join(directory, 'texts.txt'), 'wb')
+
+    def add(self, document):
+        '''Add a document of the form {'filename': string, 'text': string,
+        'words': [string]} to the corpus.'''
+        for word in document['words']:
+            self.token_ids.append(
+                self.word_to_id.setdefault(word, len(self.word_to_id)))
+        self.document_offsets.append(len(self.token_ids))
+
+        text = document.get('text', '').encode('utf-8')
+        self.texts.write(text)
+        self.text_offsets.append(self.text_offsets[-1] + len(text))
+        self.filenames.write(document.get('filename', '') + '\n')
+
+    def close(self):
+        self.filenames.close()
+        self.texts.close()
+
+        with open(os.path.join(self.directory, 'vocabulary.txt'), 'w') as outfile:
+            for word in self.word_to_id:
+                outfile.write(word + '\n')
+
+        for name in ['token_ids', 'document_offsets', 'text_offsets']:
+            np.save(os.path.join(self.directory, name + '.npy'),
+                    np.asarray(getattr(self, name)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_corpus(documents, directory):
+    '''Write an iterable of documents, as accepted by CorpusWriter.add, to a
+    corpus directory.'''
+    with CorpusWriter(directory) as writer:
+        for document in documents:
+            writer.add(document)
+
+
+def read_lines(filename):
+    with open(filename, 'r') as infile:
+        return [line.rstrip('\n') for line in infile]
+
+
+class Corpus(object):
+    '''A corpus stored in a directory by CorpusWriter.'''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.vocabulary = read_lines(os.path.join(directory, 'vocabulary.txt'))
+        self.token_ids = self.load_array('token_ids')
+        self.document_offsets = self.load_array('document_offsets')
+        self.text_offsets = self.load_array('text_offsets')
+        self._filenames = None
+        self._texts = None
+
+    def load_array(self, name):
+        return np.load(os.path.join(self.directory, name + '.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.document_offsets) - 1
+
+    def num_tokens(self):
+        return len(self.token_ids)
+
+    def document_token_ids(self, i):
+        return self.token_ids[self.document_offsets[i]:self.document_offsets[i + 1]]
+
+    def words(self, i):
+        return [self.vocabulary[t] for t in self.document_token_ids(i)]
+
+    def filename(self, i):
+        if self._filenames is None:
+            self._filenames = read_lines(
+                os.path.join(self.directory, 'filenames.txt'))
+        return self._filenames[i]
+
+    def texts(self):
+        '''Return the bytes of texts.txt, memory-mapped on first use.'''
+        if self._texts is None:
+            path = os.path.join(self.directory, 'texts.txt')
+            if os.path.getsize(path) == 0:
+                # an empty file can't be memory-mapped
+                self._texts = np.zeros(0, dtype=np.uint8)
+            else:
+                self._texts = np.memmap(path, dtype=np.uint8, mode='r')
+        return self._texts
+
+    def text(self, i):
+        start, end = self.text_offsets[i], self.text_offsets[i + 1]
+        return self.texts()[start:end].tobytes().decode('utf-8')
+
+    def __getitem__(self, i):
+        return {
+            'filename': self.filename(i),
+            'text': self.text(i),
+            'words': self.words(i),
+        }
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def document_term_matrix(self):
+        '''Return the sparse document term matrix of the corpus, with words
+        in sorted order, as in topicmodel.make_document_term_matrix with
+        sparse=True.
+
+        Returns:
+            A pair (matrix, index_to_word). Column j of the matrix is
+            document j of the corpus.
+        '''
+        words = sorted(self.vocabulary)
+        word_to_sorted_index = dict((word, i) for i, word in enumerate(words))
+        sorted_index = np.array(
+            [word_to_sorted_index[word] for word in self.vocabulary], dtype=int)
+
+        document_ids = np.repeat(
+            np.arange(len(self)), np.diff(self.document_offsets))
+        matrix = csr_matrix(
+            (np.ones(self.num_tokens()),
+             (sorted_index[self.token_ids], document_ids)),
+            shape=(len(words), len(self)))
+        return matrix, dict(enumerate(words))
+
+
+def convert(input_filename, directory):
+    '''Convert a JSON or JSON Lines file written by data/cleaner.py to a
+    corpus directory.'''
+    with open(input_filename, 'r') as infile:
+        if input_filename.endswith('.jsonl'):
+            documents = (json.loads(line) for line in infile if line.strip())
+            write_corpus(documents, directory)
+        else:
+            write_corpus(json.loads(infile.read()), directory)
+
+
+if __name__ == "__main__":
+    convert(sys.argv[1], sys.argv[2])
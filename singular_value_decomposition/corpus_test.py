@@ -0,0 +1,106 @@
+from assertpy import assert_that
+import shutil
+import tempfile
+
+from corpus import Corpus
+from corpus import write_corpus
+from topicmodel import cluster_stories
+from topicmodel import make_document_term_matrix
+
+EPSILON = 1e-9
+
+
+def test_write_and_read_corpus():
+    doc1 = {
+        'filename': 'story1.txt',
+        'words': ['b', 'c', 'a'],
+        'text': 'doc1',
+    }
+    doc2 = {
+        'filename': 'story2.txt',
+        'words': ['b', 'd', 'a', 'a'],
+        'text': 'doc2 é',
+    }
+    doc3 = {
+        'filename': 'story3.txt',
+        'words': ['e', 'd', 'b'],
+        'text': '',
+    }
+    expected_matrix, (expected_index_to_word, _) = make_document_term_matrix(
+        [doc1, doc2, doc3])
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_corpus([doc1, doc2, doc3], tmpdir)
+        corpus = Corpus(tmpdir)
+
+        assert_that(len(corpus)).is_equal_to(3)
+        assert_that(corpus.num_tokens()).is_equal_to(10)
+        assert_that(corpus.vocabulary).is_equal_to(['b', 'c', 'a', 'd', 'e'])
+        assert_that(corpus.text(1)).is_equal_to('doc2 é')
+        assert_that(list(corpus)).is_equal_to([doc1, doc2, doc3])
+
+        matrix, index_to_word = corpus.document_term_matrix()
+    finally:
+        shutil.rmtree(tmpdir)
+
+    assert_that(index_to_word).is_equal_to(expected_index_to_word)
+    flattened_actual = matrix.toarray().flatten()
+    flattened_expected = expected_matrix.flatten()
+    for (a, b) in zip(flattened_actual, flattened_expected):
+        assert_that(a).is_close_to(b, EPSILON)
+
+
+def test_texts_are_mapped_once():
+    documents = [
+        {'filename': 'a.txt', 'words': ['a'], 'text': 'first'},
+        {'filename': 'b.txt', 'words': ['b'], 'text': 'second ü'},
+    ]
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_corpus(documents, tmpdir)
+        corpus = Corpus(tmpdir)
+        texts = corpus.texts()
+        actual = [corpus.text(i) for i in [1, 0, 1]]
+        assert_that(corpus.texts()).is_same_as(texts)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    assert_that(actual).is_equal_to(['second ü', 'first', 'second ü'])
+
+
+def test_corpus_of_empty_texts():
+    documents = [{'filename': 'a.txt', 'words': ['a'], 'text': ''}]
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_corpus(documents, tmpdir)
+        actual = Corpus(tmpdir).text(0)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    assert_that(actual).is_equal_to('')
+
+
+def test_cluster_stories_of_corpus():
+    documents = [
+        {'filename': 'story{}.txt'.format(i), 'words': words, 'text': text}
+        for i, (words, text) in enumerate([
+            (['a', 'b', 'c', 'a'], 'doc1'),
+            (['b', 'c', 'a', 'b'], 'doc2'),
+            (['x', 'y', 'z', 'x'], 'doc3'),
+            (['y', 'z', 'x', 'z'], 'doc4'),
+        ])
+    ]
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_corpus(documents, tmpdir)
+        word_clusters, document_clusters = cluster_stories(
+            Corpus(tmpdir), k=2, svd_backend='block')
+    finally:
+        shutil.rmtree(tmpdir)
+
+    assert_that(set(document_clusters)).contains_only(
+        ('doc1', 'doc2'), ('doc3', 'doc4'))
@@ -1,5 +1,8 @@
+import hashlib
 import json
 import os
+from collections import OrderedDict
+from multiprocessing import Pool
 
 from nltk.corpus import stopwords, wordnet
 from nltk.stem.wordnet import WordNetLemmatizer
@@ -7,14 +10,15 @@ from nltk import pos_tag, word_tokenize
 
 
 def loadRaw(directory):
-    documents = dict()
+    return dict(iterRaw(directory))
 
-    for filename in os.listdir(directory):
+
+# Yield (filename, text) pairs one at a time, in a fixed order.
+def iterRaw(directory):
+    for filename in sorted(os.listdir(directory)):
         if filename[-3:] == 'txt':
             with open(os.path.join(directory, filename), 'r') as infile:
-                documents[filename] = infile.read()
-
-    return documents
+                yield filename, infile.read()
 
 
 def words():
@@ -23,10 +27,20 @@ def words():
         return set([line.strip() for line in infile])
 
 
+# The word list minus stopwords, loaded once per process by keptWords.
+_keptWords = None
+
+
+def keptWords():
+    global _keptWords
+    if _keptWords is None:
+        _keptWords = words() - set(stopwords.words('english'))
+    return _keptWords
+
+
 # Extract a list of tokens from a cleaned string.
 def tokenize(s):
-    stopWords = set(stopwords.words('english'))
-    wordsToKeep = words() - stopWords
+    wordsToKeep = keptWords()
 
     return [x.lower() for x in word_tokenize(s)
             if x in wordsToKeep and len(x) >= 3]
@@ -45,33 +59,283 @@ def wordnetPos(tag):
         return wordnet.NOUN
 
 
-def process(output_filename="all_stories.json"):
-    print("Loading...")
-    dirname = os.path.dirname(__file__)
-    documentDict = loadRaw(os.path.join(dirname, 'cnn-stories'))
-    documents = []
-
-    print("Cleaning...")
-    i = 0
-    for filename, documentText in documentDict.items():
-        tokens = tokenize(documentText)
-        tagged_tokens = pos_tag(tokens)
-        wnl = WordNetLemmatizer()
-        stemmedTokens = [wnl.lemmatize(word, wordnetPos(tag)).lower()
-                         for word, tag in tagged_tokens]
-
-        documents.append({
-            'filename': filename,
-            'text': documentText,
-            'words': stemmedTokens,
-        })
+class LemmaCache(object):
+    """A bounded least-recently-used cache of lemmas keyed on (word, wordnet
+    part of speech).
+
+    By Zipf's law a small vocabulary accounts for most tokens, so most calls
+    to the (slow) WordNet lemmatizer become dictionary lookups. Each worker
+    process has its own cache; lemmas computed since the last call to
+    takeNewEntries can be sent back to the parent process, merged into its
+    cache, and saved to disk for the next run.
+    """
+
+    def __init__(self, maxsize=100000, entries=()):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.newEntries = []
+        self.lemmatizer = WordNetLemmatizer()
+        self.update(entries)
+
+    def lemmatize(self, word, pos):
+        key = (word, pos)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        lemma = self.lemmatizer.lemmatize(word, pos).lower()
+        self.newEntries.append((word, pos, lemma))
+        self.update([(word, pos, lemma)])
+        return lemma
+
+    def update(self, entries):
+        for word, pos, lemma in entries:
+            self.entries[(word, pos)] = lemma
+            self.entries.move_to_end((word, pos))
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def takeNewEntries(self):
+        newEntries, self.newEntries = self.newEntries, []
+        return newEntries
+
+    def asList(self):
+        return [(word, pos, lemma)
+                for (word, pos), lemma in self.entries.items()]
+
+    @staticmethod
+    def load(filename, maxsize=100000):
+        entries = []
+        if filename is not None and os.path.exists(filename):
+            with open(filename, 'r') as infile:
+                entries = json.loads(infile.read())
+        return LemmaCache(maxsize=maxsize, entries=entries)
+
+    def save(self, filename):
+        with open(filename, 'w') as outfile:
+            outfile.write(json.dumps(self.asList()))
+
+
+# The lemma cache of the current process, set up by initWorker.
+_lemmaCache = None
+
+
+def lemmaCache():
+    global _lemmaCache
+    if _lemmaCache is None:
+        _lemmaCache = LemmaCache()
+    return _lemmaCache
+
+
+# Return the cleaned document along with any lemmas this process computed
+# for it, so the parent process can merge them into the shared cache.
+def cleanDocument(item):
+    filename, documentText = item
+    tokens = tokenize(documentText)
+    tagged_tokens = pos_tag(tokens)
+    cache = lemmaCache()
+    stemmedTokens = [cache.lemmatize(word, wordnetPos(tag))
+                     for word, tag in tagged_tokens]
+
+    document = {
+        'filename': filename,
+        'text': documentText,
+        'words': stemmedTokens,
+    }
+    return document, cache.takeNewEntries()
+
+
+def initWorker(lemmaCacheEntries=(), lemmaCacheSize=100000):
+    global _lemmaCache
+    keptWords()
+    _lemmaCache = LemmaCache(maxsize=lemmaCacheSize, entries=lemmaCacheEntries)
+
+
+# Write JSON-encoded documents to outfile (opened in binary mode) as they
+# arrive, either as a JSON array or as JSON Lines (one document per line, so
+# it can be streamed). Return the (offset, length) in bytes of each record.
+def writeRecords(records, outfile, jsonLines=False):
+    positions = []
+    offset = 0
+
+    def write(data):
+        nonlocal offset
+        outfile.write(data)
+        offset += len(data)
+
+    if not jsonLines:
+        write(b'[')
+
+    for i, record in enumerate(records):
+        if i > 0 and not jsonLines:
+            write(b', ')
+        data = record.encode('utf-8')
+        positions.append((offset, len(data)))
+        write(data)
+        if jsonLines:
+            write(b'\n')
+
         if i % 100 == 0:
             print(i)
-        i += 1
 
-    print("Writing to disk...")
-    with open(os.path.join(dirname, output_filename), 'w') as outfile:
-        outfile.write(json.dumps(documents))
+    if not jsonLines:
+        write(b']')
+
+    return positions
+
+
+# Hash a file a block at a time, so it is never read into memory at once.
+def fileHash(path, blockSize=2 ** 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as infile:
+        for block in iter(lambda: infile.read(blockSize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# The manifest records, for each story in the output file, the story's size,
+# modification time and content hash, and the position of its cleaned record
+# in the output file. It also records the size and hash of the output file
+# itself, since the offsets are only valid for that exact file. Return its
+# entries, or an empty dict if there is no manifest for this output file
+# (for instance, if a run replaced the output but died before writing the
+# new manifest).
+def loadManifest(manifestPath, outputPath):
+    if not (os.path.exists(manifestPath) and os.path.exists(outputPath)):
+        return dict()
+
+    with open(manifestPath, 'r') as infile:
+        manifest = json.loads(infile.read())
+
+    if (manifest.get('output') != os.path.basename(outputPath)
+            or manifest.get('outputSize') != os.path.getsize(outputPath)
+            or manifest.get('outputSha1') != fileHash(outputPath)):
+        return dict()
+    return manifest['files']
+
+
+# Write the manifest to a temporary file and move it into place, so that a
+# run that dies part way through never leaves a truncated manifest.
+def saveManifest(manifestPath, outputPath, files):
+    temporaryPath = manifestPath + '.tmp'
+    with open(temporaryPath, 'w') as outfile:
+        outfile.write(json.dumps({
+            'output': os.path.basename(outputPath),
+            'outputSize': os.path.getsize(outputPath),
+            'outputSha1': fileHash(outputPath),
+            'files': files,
+        }))
+    os.replace(temporaryPath, manifestPath)
+
+
+# Return a list of (filename, fileInfo, previousEntry) for each story, where
+# previousEntry is the story's manifest entry if its cleaned record in the
+# previous output can be reused, and None if the story is new or changed.
+# Stories whose size and modification time are unchanged are not re-read;
+# otherwise they are compared by content hash.
+def planCleaning(directory, previousFiles):
+    plan = []
+    for filename in sorted(os.listdir(directory)):
+        if filename[-3:] != 'txt':
+            continue
+
+        path = os.path.join(directory, filename)
+        stat = os.stat(path)
+        info = {'size': stat.st_size, 'mtime': stat.st_mtime}
+        previous = previousFiles.get(filename)
+
+        if (previous is not None and previous['size'] == info['size']
+                and previous['mtime'] == info['mtime']):
+            info['sha1'] = previous['sha1']
+        else:
+            info['sha1'] = fileHash(path)
+            if previous is not None and previous['sha1'] != info['sha1']:
+                previous = None
+
+        plan.append((filename, info, previous))
+
+    return plan
+
+
+# Yield the JSON-encoded record of each story in the plan (as returned by
+# planCleaning), in order: the next of the cleaning results (pairs of a
+# document and its new lemmas, which are added to cache) for a story that
+# needs cleaning, and its record copied from previousOutput (the previous
+# output file, opened in binary mode) otherwise.
+def records(plan, results, previousOutput, cache):
+    for filename, info, previous in plan:
+        if previous is None:
+            document, newLemmas = next(results)
+            cache.update(newLemmas)
+            yield json.dumps(document)
+        else:
+            previousOutput.seek(previous['offset'])
+            yield previousOutput.read(previous['length']).decode('utf-8')
+
+
+# Clean all the stories in a pool of worker processes (one per CPU by
+# default). Documents are sent to the workers in chunks, and the results are
+# written to disk in order as they come back, so neither the raw nor the
+# cleaned corpus is ever held in memory all at once.
+#
+# Only stories that are new or changed since the last run (according to a
+# manifest stored next to the output file) are cleaned; the records of the
+# others are copied from the previous output.
+#
+# Lemmas are cached in each worker, and the caches are seeded from (and the
+# new lemmas saved back to) lemmaCacheFilename, if it is not None.
+def process(output_filename="all_stories.json", processes=None, chunksize=16,
+            lemmaCacheFilename="lemma-cache.json", lemmaCacheSize=100000,
+            storiesDirectory=None):
+    dirname = os.path.dirname(__file__)
+    if storiesDirectory is None:
+        storiesDirectory = os.path.join(dirname, 'cnn-stories')
+    outputPath = os.path.join(dirname, output_filename)
+    manifestPath = outputPath + '.manifest'
+    if lemmaCacheFilename is not None:
+        lemmaCacheFilename = os.path.join(dirname, lemmaCacheFilename)
+    cache = LemmaCache.load(lemmaCacheFilename, maxsize=lemmaCacheSize)
+
+    print("Checking for new or changed stories...")
+    plan = planCleaning(storiesDirectory, loadManifest(manifestPath, outputPath))
+    changed = [filename for (filename, _, previous) in plan if previous is None]
+    print("{} of {} stories need cleaning".format(len(changed), len(plan)))
+
+    def changedDocuments():
+        for filename in changed:
+            with open(os.path.join(storiesDirectory, filename), 'r') as infile:
+                yield filename, infile.read()
+
+    print("Cleaning and writing to disk...")
+    workerArgs = (cache.asList(), lemmaCacheSize)
+    temporaryPath = outputPath + '.tmp'
+    previousOutput = open(outputPath, 'rb') if len(changed) < len(plan) else None
+    try:
+        with Pool(processes=processes, initializer=initWorker,
+                  initargs=workerArgs) as pool, \
+                open(temporaryPath, 'wb') as outfile:
+            results = pool.imap(
+                cleanDocument, changedDocuments(), chunksize=chunksize)
+            positions = writeRecords(
+                records(plan, results, previousOutput, cache), outfile,
+                jsonLines=output_filename.endswith('.jsonl'))
+    except BaseException:
+        # don't leave a partial output behind if a worker fails
+        if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+        raise
+    finally:
+        if previousOutput is not None:
+            previousOutput.close()
+
+    os.replace(temporaryPath, outputPath)
+    saveManifest(manifestPath, outputPath, dict(
+        (filename, dict(info, offset=offset, length=length))
+        for (filename, info, _), (offset, length) in zip(plan, positions)))
+
+    if lemmaCacheFilename is not None:
+        cache.save(lemmaCacheFilename)
 
     print("Done!")
 
@@ -0,0 +1,127 @@
+'''An on-disk cache of normalized document term matrices and their singular
+value decompositions, so that rerunning the topic model on an unchanged
+corpus skips straight to clustering.
+
+Entries are content-addressed: the key is a hash of the raw document term
+matrix together with the settings that determine the decomposition (the
+weighting, the SVD backend, k, and so on). Each entry is a subdirectory of
+the cache directory holding .npy files, which are memory-mapped when read.
+When the cache grows past max_bytes, the least recently used entries are
+deleted, using each entry directory's modification time as its last use.
+'''
+import hashlib
+import numpy as np
+import os
+import shutil
+import tempfile
+from scipy.sparse import csr_matrix
+from scipy.sparse import issparse
+
+
+def hash_array(digest, array):
+    array = np.ascontiguousarray(array)
+    digest.update(str((array.dtype.str, array.shape)).encode('utf-8'))
+    digest.update(array.data)
+
+
+def directory_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(directory, filename))
+        for filename in os.listdir(directory))
+
+
+class DecompositionCache(object):
+    def __init__(self, directory, max_bytes=2 ** 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, matrix, **settings):
+        '''Return the cache key for a document term matrix (dense or
+        sparse) and the settings used to decompose it.'''
+        digest = hashlib.sha256()
+        if issparse(matrix):
+            matrix = csr_matrix(matrix)
+            matrix.sum_duplicates()
+            matrix.sort_indices()
+            digest.update(str(matrix.shape).encode('utf-8'))
+            for array in [matrix.data, matrix.indices, matrix.indptr]:
+                hash_array(digest, array)
+        else:
+            hash_array(digest, np.asarray(matrix))
+
+        digest.update(repr(sorted(settings.items())).encode('utf-8'))
+        return digest.hexdigest()
+
+    def entry_directory(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        '''Return the cached (matrix, (singular_values, U, V)) for a key, or
+        None if there is no such entry. The arrays are memory-mapped.'''
+        directory = self.entry_directory(key)
+        if not os.path.isdir(directory):
+            return None
+
+        def load(name):
+            return np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+
+        if os.path.exists(os.path.join(directory, 'matrix.npy')):
+            matrix = load('matrix')
+        else:
+            matrix = csr_matrix(
+                (load('data'), load('indices'), load('indptr')),
+                shape=tuple(load('shape')))
+
+        # mark the entry as recently used
+        os.utime(directory)
+        return matrix, (load('singular_values'), load('U'), load('V'))
+
+    def put(self, key, matrix, decomposition):
+        '''Store a normalized matrix and its decomposition (singular_values,
+        U, V) under a key, then evict old entries if the cache is too big.'''
+        arrays = dict(zip(['singular_values', 'U', 'V'], decomposition))
+        if issparse(matrix):
+            matrix = csr_matrix(matrix)
+            arrays.update(
+                data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                shape=np.array(matrix.shape))
+        else:
+            arrays['matrix'] = matrix
+
+        # write to a temporary directory and rename it into place, so a
+        # reader never sees a partially written entry
+        temporary = tempfile.mkdtemp(dir=self.directory, prefix='.')
+        for name, array in arrays.items():
+            np.save(os.path.join(temporary, name + '.npy'), np.asarray(array))
+
+        directory = self.entry_directory(key)
+        if os.path.isdir(directory):
+            shutil.rmtree(temporary)
+        else:
+            os.rename(temporary, directory)
+
+        self.evict()
+
+    def entries(self):
+        '''Return a list of (key, last use time, size in bytes) for each
+        entry, least recently used first.'''
+        entries = []
+        for key in os.listdir(self.directory):
+            directory = self.entry_directory(key)
+            if key.startswith('.') or not os.path.isdir(directory):
+                continue
+            entries.append(
+                (key, os.path.getmtime(directory), directory_size(directory)))
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def evict(self):
+        '''Delete least recently used entries until the cache is no larger
+        than max_bytes. The most recently used entry is always kept.'''
+        entries = self.entries()
+        total = sum(size for (_, _, size) in entries)
+        for key, _, size in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.entry_directory(key))
+            total -= size
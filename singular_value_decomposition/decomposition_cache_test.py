@@ -0,0 +1,91 @@
+from assertpy import assert_that
+from scipy.sparse import csr_matrix
+import numpy
+import os
+import shutil
+import tempfile
+
+from decomposition_cache import DecompositionCache
+from topicmodel import cluster_document_term_matrix
+
+
+def make_cache(max_bytes=2 ** 30):
+    directory = tempfile.mkdtemp()
+    return DecompositionCache(directory, max_bytes=max_bytes), directory
+
+
+def test_key_depends_on_matrix_and_settings():
+    cache, directory = make_cache()
+    try:
+        matrix = csr_matrix(numpy.array([[1, 0, 2], [0, 3, 0]]))
+        key = cache.key(matrix, k=2, weighting='log-entropy')
+
+        assert_that(cache.key(matrix.copy(), k=2, weighting='log-entropy')) \
+            .is_equal_to(key)
+        assert_that(cache.key(matrix.toarray(), k=2, weighting='log-entropy')) \
+            .is_not_equal_to(key)
+        assert_that(cache.key(matrix, k=3, weighting='log-entropy')) \
+            .is_not_equal_to(key)
+        assert_that(cache.key(2 * matrix, k=2, weighting='log-entropy')) \
+            .is_not_equal_to(key)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_put_and_get():
+    cache, directory = make_cache()
+    try:
+        matrix = csr_matrix(numpy.array([[1.0, 0, 2], [0, 3, 0]]))
+        decomposition = numpy.linalg.svd(matrix.toarray(), full_matrices=False)
+        U, singular_values, V = decomposition
+        assert_that(cache.get('missing')).is_none()
+
+        cache.put('key', matrix, (singular_values, U, V))
+        cached_matrix, (cached_values, cached_U, cached_V) = cache.get('key')
+
+        numpy.testing.assert_array_equal(
+            cached_matrix.toarray(), matrix.toarray())
+        numpy.testing.assert_array_equal(cached_values, singular_values)
+        numpy.testing.assert_array_equal(cached_U, U)
+        numpy.testing.assert_array_equal(cached_V, V)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_evicts_least_recently_used():
+    cache, directory = make_cache()
+    try:
+        dense = numpy.ones((10, 10))
+        decomposition = (numpy.ones(2), numpy.ones((10, 2)), numpy.ones((2, 10)))
+        cache.put('a', dense, decomposition)
+        cache.put('b', dense, decomposition)
+        os.utime(os.path.join(directory, 'a'), (0, 0))
+        os.utime(os.path.join(directory, 'b'), (1, 1))
+
+        # reading 'a' makes 'b' the least recently used entry
+        cache.get('a')
+        cache.max_bytes = cache.entries()[0][2] + 1
+        cache.evict()
+        assert_that([key for (key, _, _) in cache.entries()]) \
+            .is_equal_to(['a'])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_cluster_document_term_matrix_uses_cache():
+    cache, directory = make_cache()
+    try:
+        numpy.random.seed(1)
+        matrix = csr_matrix(numpy.random.randint(0, 3, size=(20, 12)))
+        expected = cluster_document_term_matrix(matrix, k=2, cache=cache)
+        assert_that(cache.entries()).is_length(1)
+
+        actual = cluster_document_term_matrix(matrix, k=2, cache=cache)
+        assert_that(cache.entries()).is_length(1)
+        assert_that(len(actual[0])).is_equal_to(len(expected[0]))
+        assert_that(len(actual[1])).is_equal_to(len(expected[1]))
+
+        cluster_document_term_matrix(matrix, k=3, cache=cache)
+        assert_that(cache.entries()).is_length(2)
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,118 @@
+'''A streaming sketch of a matrix whose columns arrive one at a time, using
+the Frequent Directions algorithm of Liberty (2013).
+
+The sketch of an m-by-n matrix A (for the topic model, m words by n
+documents, where n grows without bound) is an m-by-ell matrix B with
+
+    0 <= x^T (A A^T - B B^T) x <= 2 ||A||_F^2 / ell
+
+for every unit vector x. So the top left singular vectors and singular
+values of B approximate those of A, while the sketch uses O(m * ell)
+memory no matter how many columns have been seen.
+'''
+import numpy as np
+from collections import Counter
+from scipy.sparse import issparse
+
+
+class FrequentDirections(object):
+    def __init__(self, num_rows, ell):
+        '''Create an empty sketch of a matrix with num_rows rows, keeping
+        ell columns. The sketch buffers up to 2 * ell columns between
+        shrinking steps.'''
+        self.num_rows = num_rows
+        self.ell = ell
+        self.sketch = np.zeros((num_rows, 2 * ell))
+        self.next_column = 0
+        self.num_columns_seen = 0
+        self.squared_frobenius_norm = 0
+
+    def add_column(self, column):
+        '''Add one column (a dense vector of length num_rows) of the matrix
+        to the sketch.'''
+        if self.next_column == self.sketch.shape[1]:
+            self.shrink()
+
+        self.sketch[:, self.next_column] = column
+        self.next_column += 1
+        self.num_columns_seen += 1
+        self.squared_frobenius_norm += np.dot(column, column)
+
+    def add_columns(self, columns):
+        '''Add each column of a (dense or scipy.sparse) matrix to the
+        sketch.'''
+        if not issparse(columns):
+            for j in range(columns.shape[1]):
+                self.add_column(np.ravel(columns[:, j]))
+            return
+
+        # convert once, so that each column is a slice of the CSC arrays
+        columns = columns.tocsc()
+        columns.sum_duplicates()
+        column = np.zeros(self.num_rows)
+        for j in range(columns.shape[1]):
+            start, end = columns.indptr[j], columns.indptr[j + 1]
+            column[:] = 0
+            column[columns.indices[start:end]] = columns.data[start:end]
+            self.add_column(column)
+
+    def shrink(self):
+        '''Rotate the buffered columns onto the left singular vectors of the
+        sketch and subtract the ell-th largest squared singular value from
+        every squared singular value. This zeroes out at least half of the
+        columns, making room for new ones.'''
+        U, singular_values, _ = np.linalg.svd(
+            self.sketch[:, :self.next_column], full_matrices=False)
+        delta = singular_values[self.ell - 1] ** 2 \
+            if len(singular_values) >= self.ell else 0
+        shrunk = np.sqrt(np.maximum(singular_values ** 2 - delta, 0))
+
+        self.sketch[:] = 0
+        rank = np.count_nonzero(shrunk)
+        self.sketch[:, :rank] = U[:, :rank] * shrunk[:rank]
+        self.next_column = rank
+
+    def error_bound(self):
+        '''Return the bound 2 ||A||_F^2 / ell on the spectral norm of
+        A A^T - B B^T for the columns A seen so far.'''
+        return 2 * self.squared_frobenius_norm / self.ell
+
+    def svd(self, k):
+        '''Return the approximate top-k singular value decomposition of the
+        matrix seen so far, as a tuple (S, u, v) like svd.svd.
+
+        The sketch does not retain the columns, so the right singular
+        vectors v are not available and None is returned in their place.
+        To get a column's coordinates in the latent space (a column of
+        diag(S) v), project it onto u, as with U^T A in the topic model.
+        '''
+        U, singular_values, _ = np.linalg.svd(
+            self.sketch[:, :self.next_column], full_matrices=False)
+        return singular_values[:k], U[:, :k], None
+
+
+def sketch_documents(documents, vocabulary, ell=50):
+    '''Sketch the document term matrix of a (possibly unbounded) stream of
+    documents, as accepted by topicmodel.cluster_stories.
+
+    The rows of the matrix must be fixed in advance, so words outside the
+    given vocabulary are ignored. Each count is weighted by log(1 + count);
+    the entropy (global) factor of topicmodel.normalize needs statistics of
+    the whole corpus, so it is not applied.
+
+    Returns:
+        A FrequentDirections sketch with one row per word of vocabulary.
+    '''
+    word_to_index = dict((word, i) for i, word in enumerate(vocabulary))
+    sketch = FrequentDirections(len(word_to_index), ell)
+    column = np.zeros(len(word_to_index))
+
+    for document in documents:
+        counts = Counter(
+            word for word in document['words'] if word in word_to_index)
+        column[:] = 0
+        for word, count in counts.items():
+            column[word_to_index[word]] = np.log1p(count)
+        sketch.add_column(column)
+
+    return sketch
@@ -0,0 +1,81 @@
+from assertpy import assert_that
+from scipy.sparse import coo_matrix
+from scipy.sparse import csr_matrix
+import numpy as np
+
+from frequent_directions import FrequentDirections
+from frequent_directions import sketch_documents
+
+
+def low_rank_matrix(shape, rank, seed=0):
+    random_state = np.random.RandomState(seed)
+    left, _ = np.linalg.qr(random_state.standard_normal((shape[0], rank)))
+    right, _ = np.linalg.qr(random_state.standard_normal((shape[1], rank)))
+    return np.dot(left * np.arange(rank, 0, -1), right.T)
+
+
+def test_error_bound():
+    A = np.random.RandomState(1).standard_normal((20, 300))
+    sketch = FrequentDirections(20, ell=8)
+    for j in range(A.shape[1]):
+        sketch.add_column(A[:, j])
+
+    B = sketch.sketch[:, :sketch.next_column]
+    difference = np.dot(A, A.T) - np.dot(B, B.T)
+    eigenvalues = np.linalg.eigvalsh(difference)
+    assert_that(sketch.num_columns_seen).is_equal_to(300)
+    assert_that(sketch.next_column).is_less_than_or_equal_to(16)
+    assert_that(eigenvalues.min()).is_greater_than(-1e-8)
+    assert_that(eigenvalues.max()).is_less_than_or_equal_to(sketch.error_bound())
+
+
+def test_svd_recovers_low_rank_matrix():
+    A = low_rank_matrix((30, 500), rank=4)
+    sketch = FrequentDirections(30, ell=6)
+    sketch.add_columns(csr_matrix(A))
+
+    singular_values, U, V = sketch.svd(4)
+    expected_U, expected_singular_values, _ = np.linalg.svd(A)
+    assert_that(V).is_none()
+    assert_that(U.shape).is_equal_to((30, 4))
+    np.testing.assert_allclose(
+        singular_values, expected_singular_values[:4], rtol=1e-8)
+    np.testing.assert_allclose(
+        np.abs(np.dot(U.T, expected_U[:, :4])), np.eye(4), atol=1e-8)
+
+
+def test_add_sparse_columns_matches_dense():
+    A = np.random.RandomState(2).standard_normal((10, 40))
+    A[A < 0.5] = 0
+    dense_sketch = FrequentDirections(10, ell=4)
+    dense_sketch.add_columns(A)
+
+    # split each entry in two, to check that duplicate entries are summed
+    rows, columns = np.nonzero(A)
+    halves = A[rows, columns] / 2
+    duplicated = coo_matrix((
+        np.concatenate([halves, halves]),
+        (np.concatenate([rows, rows]), np.concatenate([columns, columns]))),
+        shape=A.shape)
+    sparse_sketch = FrequentDirections(10, ell=4)
+    sparse_sketch.add_columns(duplicated)
+
+    np.testing.assert_allclose(
+        sparse_sketch.sketch, dense_sketch.sketch, atol=1e-10)
+    assert_that(sparse_sketch.squared_frobenius_norm).is_close_to(
+        dense_sketch.squared_frobenius_norm, 1e-10)
+
+
+def test_sketch_documents():
+    documents = [
+        {'words': ['a', 'b', 'a', 'unknown']},
+        {'words': ['c', 'd', 'c']},
+        {'words': ['a', 'b']},
+    ] * 10
+    sketch = sketch_documents(documents, ['a', 'b', 'c', 'd'], ell=3)
+    singular_values, U, _ = sketch.svd(2)
+
+    assert_that(sketch.num_columns_seen).is_equal_to(30)
+    assert_that(U.shape).is_equal_to((4, 2))
+    # the two topics, {a, b} and {c, d}, use disjoint words
+    np.testing.assert_allclose(np.abs(U[:2, 0] * U[2:, 0]), 0, atol=1e-8)
@@ -0,0 +1,163 @@
+'''A latent semantic index: answer "which documents are like this one?"
+using the SVD-based topic model, without recomputing the model.
+
+The index stores the vocabulary, the weighting scheme and the global
+normalization factor of each word, the top singular values and left singular
+vectors U of the normalized document term matrix, and the projection of each
+document onto U. A query is a list of words: it is normalized the same way
+as the documents, folded into the latent space by projecting onto U, and
+compared against every document's projection by cosine similarity in a
+single matrix product.
+'''
+import json
+import numpy as np
+import os
+from collections import Counter
+
+from corpus import read_lines
+from topicmodel import SVD_BACKENDS
+from topicmodel import TermStatistics
+from topicmodel import apply_local_weights
+from topicmodel import average_document_length
+from topicmodel import canonical_csr
+from topicmodel import global_factors
+from topicmodel import make_document_term_matrix
+from topicmodel import normalize
+from topicmodel import term_statistics
+
+
+def unit_rows(vectors):
+    '''Scale each row of vectors to have unit length, leaving zero rows
+    unchanged.'''
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1
+    return vectors / norms[:, np.newaxis]
+
+
+class LatentSemanticIndex(object):
+    def __init__(self, vocabulary, global_factors, singular_values, U,
+                 projected_documents, weighting='log-entropy',
+                 average_document_length=1):
+        self.vocabulary = list(vocabulary)
+        self.word_to_index = dict(
+            (word, i) for i, word in enumerate(self.vocabulary))
+        self.global_factors = global_factors
+        self.weighting = weighting
+        # only used by the bm25 weighting, to saturate the counts of a query
+        self.average_document_length = average_document_length
+        self.singular_values = singular_values
+        self.U = U
+        self.projected_documents = projected_documents
+        self.unit_projected_documents = unit_rows(projected_documents)
+
+    @staticmethod
+    def from_matrix(matrix, index_to_word, k=10, svd_backend='power',
+                    weighting='log-entropy'):
+        '''Build an index from a sparse document term matrix of word counts,
+        as returned by make_document_term_matrix with sparse=True, normalized
+        with one of the weighting schemes of topicmodel.normalize.'''
+        matrix = canonical_csr(matrix)
+        statistics = term_statistics(matrix)
+        factors = global_factors(
+            statistics, matrix.shape[1], weighting=weighting)
+        normalized = normalize(
+            matrix, weighting=weighting, statistics=statistics,
+            factors=factors)
+        singular_values, U, _ = SVD_BACKENDS[svd_backend](normalized, k)
+        vocabulary = [index_to_word[i] for i in range(len(index_to_word))]
+        return LatentSemanticIndex(
+            vocabulary, factors, singular_values, U, normalized.T.dot(U),
+            weighting=weighting,
+            average_document_length=average_document_length(statistics))
+
+    @staticmethod
+    def from_documents(documents, k=10, svd_backend='power',
+                       weighting='log-entropy'):
+        '''Build an index from a list of documents as accepted by
+        topicmodel.cluster_stories. Document i of the index is documents[i].'''
+        matrix, (index_to_word, _) = make_document_term_matrix(
+            documents, sparse=True)
+        return LatentSemanticIndex.from_matrix(
+            matrix, index_to_word, k=k, svd_backend=svd_backend,
+            weighting=weighting)
+
+    def fold_in(self, words):
+        '''Project a document, given as a list of words, onto the latent
+        space, weighting it the same way as the indexed documents. Words not
+        in the vocabulary are ignored.'''
+        counts = Counter(word for word in words if word in self.word_to_index)
+        indices = np.array([self.word_to_index[w] for w in counts], dtype=int)
+        weights = np.array(list(counts.values()), dtype=float)
+        statistics = TermStatistics(
+            None, None, None, np.array([weights.sum()]))
+        apply_local_weights(
+            weights, np.zeros(len(weights), dtype=int), statistics,
+            self.weighting, average_length=self.average_document_length)
+        weights *= self.global_factors[indices]
+        return np.dot(weights, self.U[indices])
+
+    def most_similar(self, projection, n=10):
+        '''Return the indices and cosine similarities of the n documents
+        whose projections are most similar to the given projection, most
+        similar first.'''
+        similarities = np.dot(
+            self.unit_projected_documents, unit_rows(projection[np.newaxis])[0])
+        n = min(n, len(similarities))
+        if n == 0:
+            return []
+
+        # find the top n in linear time, then sort just those
+        top = np.argpartition(-similarities, n - 1)[:n]
+        top = top[np.argsort(-similarities[top])]
+        return [(int(i), float(similarities[i])) for i in top]
+
+    def query(self, words, n=10):
+        '''Return the n documents most similar to a new document given as a
+        list of words, as a list of (document index, similarity) pairs.'''
+        return self.most_similar(self.fold_in(words), n=n)
+
+    def similar_documents(self, document_index, n=10):
+        '''Return the n documents most similar to an indexed document,
+        excluding the document itself.'''
+        results = self.most_similar(
+            self.projected_documents[document_index], n=n + 1)
+        return [(i, s) for (i, s) in results if i != document_index][:n]
+
+    def save(self, directory):
+        '''Save the index to a directory. The arrays are stored as .npy files,
+        so load can memory-map them.'''
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'vocabulary.txt'), 'w') as outfile:
+            for word in self.vocabulary:
+                outfile.write(word + '\n')
+
+        for name in ['global_factors', 'singular_values', 'U',
+                     'projected_documents']:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+        with open(os.path.join(directory, 'parameters.json'), 'w') as outfile:
+            json.dump({
+                'weighting': self.weighting,
+                'average_document_length': float(self.average_document_length),
+            }, outfile)
+
+    @staticmethod
+    def load(directory):
+        def load_array(name):
+            return np.load(
+                os.path.join(directory, name + '.npy'), mmap_mode='r')
+
+        # indices saved before the weighting was stored used log-entropy
+        parameters = dict()
+        parameters_path = os.path.join(directory, 'parameters.json')
+        if os.path.exists(parameters_path):
+            with open(parameters_path, 'r') as infile:
+                parameters = json.load(infile)
+
+        return LatentSemanticIndex(
+            read_lines(os.path.join(directory, 'vocabulary.txt')),
+            load_array('global_factors'),
+            load_array('singular_values'),
+            load_array('U'),
+            load_array('projected_documents'),
+            **parameters)
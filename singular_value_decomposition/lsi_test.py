@@ -0,0 +1,93 @@
+from assertpy import assert_that
+import numpy
+import random
+import shutil
+import tempfile
+
+import lsi
+import topicmodel
+from lsi import LatentSemanticIndex
+
+EPSILON = 1e-9
+
+DOCUMENTS = [
+    {'words': ['b', 'c', 'a', 'd', 'e', 'c']},
+    {'words': ['b', 'd', 'a', 'e', 'e', 'c']},
+    {'words': ['x', 'y', 'z', 'x', 'y', 'w']},
+    {'words': ['w', 'y', 'z', 'y', 'z']},
+    {'words': ['z', 'w', 'z', 'w', 'w']},
+    {'words': ['c', 'c', 'a', 'e', 'e']},
+]
+
+
+def test_fold_in_matches_indexed_projection():
+    random.seed(1)
+    numpy.random.seed(1)
+    index = LatentSemanticIndex.from_documents(DOCUMENTS, k=2)
+
+    for i, document in enumerate(DOCUMENTS):
+        projection = index.fold_in(document['words'])
+        for (a, b) in zip(projection, index.projected_documents[i]):
+            assert_that(a).is_close_to(b, EPSILON)
+
+
+def test_fold_in_uses_the_index_weighting():
+    for weighting in topicmodel.WEIGHTINGS:
+        random.seed(1)
+        numpy.random.seed(1)
+        index = LatentSemanticIndex.from_documents(
+            DOCUMENTS, k=2, weighting=weighting)
+        assert_that(index.weighting).is_equal_to(weighting)
+
+        for i, document in enumerate(DOCUMENTS):
+            projection = index.fold_in(document['words'])
+            for (a, b) in zip(projection, index.projected_documents[i]):
+                assert_that(a).is_close_to(b, EPSILON)
+
+
+def test_from_documents_computes_term_statistics_once(monkeypatch):
+    calls = []
+
+    def counted_term_statistics(matrix, **kwargs):
+        calls.append(matrix.shape)
+        return term_statistics(matrix, **kwargs)
+
+    term_statistics = topicmodel.term_statistics
+    monkeypatch.setattr(topicmodel, 'term_statistics', counted_term_statistics)
+    monkeypatch.setattr(lsi, 'term_statistics', counted_term_statistics)
+    random.seed(1)
+    numpy.random.seed(1)
+    LatentSemanticIndex.from_documents(DOCUMENTS, k=2)
+    assert_that(calls).is_length(1)
+
+
+def test_query():
+    random.seed(1)
+    numpy.random.seed(1)
+    index = LatentSemanticIndex.from_documents(DOCUMENTS, k=2)
+
+    results = index.query(['y', 'z', 'unknown'], n=3)
+    assert_that(set(i for (i, _) in results)).is_equal_to({2, 3, 4})
+
+    results = index.similar_documents(0, n=2)
+    assert_that(set(i for (i, _) in results)).is_equal_to({1, 5})
+
+
+def test_save_and_load():
+    random.seed(1)
+    numpy.random.seed(1)
+    index = LatentSemanticIndex.from_documents(
+        DOCUMENTS, k=2, weighting='bm25')
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        index.save(tmpdir)
+        loaded = LatentSemanticIndex.load(tmpdir)
+        assert_that(loaded.vocabulary).is_equal_to(index.vocabulary)
+        assert_that(loaded.weighting).is_equal_to('bm25')
+        assert_that(loaded.average_document_length).is_equal_to(
+            index.average_document_length)
+        assert_that(loaded.query(['a', 'b'])).is_equal_to(
+            index.query(['a', 'b']))
+    finally:
+        shutil.rmtree(tmpdir)
@@ -1,12 +1,23 @@
 if __name__ == "__main__":
     import json
+    import os
 
-    with open('all_stories.json', 'r') as infile:
-        data = json.loads(infile.read())
+    if os.path.isdir('all_stories.corpus'):
+        from corpus import Corpus
 
-    allWords = set()
-    for entry in data:
-        allWords |= set(entry['words'])
+        # a corpus directory can be summarized without decoding any text
+        corpus = Corpus('all_stories.corpus')
+        print('{} unique words in all the stories'.format(
+            len(corpus.vocabulary)))
+        print('{} documents total'.format(len(corpus)))
+        print('{} words total'.format(corpus.num_tokens()))
+    else:
+        with open('all_stories.json', 'r') as infile:
+            data = json.loads(infile.read())
 
-    print('{} unique words in all the stories'.format(len(allWords)))
-    print('{} documents total'.format(len(data)))
+        allWords = set()
+        for entry in data:
+            allWords |= set(entry['words'])
+
+        print('{} unique words in all the stories'.format(len(allWords)))
+        print('{} documents total'.format(len(data)))
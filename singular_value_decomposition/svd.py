@@ -1,50 +1,254 @@
+import logging
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from numpy.linalg import norm
+from scipy.sparse import issparse
+from scipy.sparse.linalg import LinearOperator
+from scipy.sparse.linalg import aslinearoperator
+from scipy.sparse.linalg import svds
 
-from random import normalvariate
-from math import sqrt
+# Convergence messages are logged at the DEBUG level; configure this logger
+# (or the root logger) to see them.
+logger = logging.getLogger(__name__)
 
 
-def random_unit_vector(n):
-    unnormalized = [normalvariate(0, 1) for _ in range(n)]
-    the_norm = sqrt(sum(x * x for x in unnormalized))
-    return [x / the_norm for x in unnormalized]
+class ConvergenceError(Exception):
+    '''Raised when the power method does not converge within the allowed
+    number of iterations.'''
+    pass
 
 
-def svd_1d(A, epsilon=1e-10):
+def random_normal(shape, random_state=None):
+    '''Sample standard normal entries from random_state (a
+    numpy.random.RandomState), or from numpy's global random state if it
+    is None.'''
+    if random_state is None:
+        return np.random.standard_normal(shape)
+    return random_state.standard_normal(shape)
+
+
+def random_unit_vector(n, random_state=None):
+    unnormalized = random_normal(n, random_state)
+    return unnormalized / norm(unnormalized)
+
+
+def svd_1d(A, epsilon=1e-10, gram_matrix=True, max_iterations=10000,
+           initial_vector=None, random_state=None):
     '''Compute the one-dimensional SVD.
 
     Arguments:
         A: an n-by-m matrix
         epsilon: a tolerance
+        gram_matrix: if True, compute B = A^T A (or A A^T) up front and
+            iterate with B. If False, apply A and A^T in turn at each step,
+            so that nothing larger than A is ever allocated. This works for
+            sparse matrices and linear operators as well as arrays.
+        max_iterations: raise a ConvergenceError if the method has not
+            converged after this many iterations.
+        initial_vector: the vector (of length min(n, m)) to start iterating
+            from, e.g., the singular vector of a similar matrix. If None,
+            start from a random unit vector.
+        random_state: a numpy.random.RandomState used for the random start.
+            If None, use numpy's global random state.
 
     Returns:
         the top singular vector of A.
     '''
 
     n, m = A.shape
-    x = random_unit_vector(min(n, m))
+    if initial_vector is None:
+        x = random_unit_vector(min(n, m), random_state)
+    else:
+        x = np.asarray(initial_vector, dtype=float) / norm(initial_vector)
     last_v = None
     current_v = x
 
-    if n > m:
-        B = np.dot(A.T, A)
+    if gram_matrix:
+        B = np.dot(A.T, A) if n > m else np.dot(A, A.T)
+
+        def apply_B(v):
+            return np.dot(B, v)
+    elif n > m:
+        def apply_B(v):
+            return A.T.dot(A.dot(v))
     else:
-        B = np.dot(A, A.T)
+        def apply_B(v):
+            return A.dot(A.T.dot(v))
 
-    iterations = 0
-    while True:
-        iterations += 1
+    for iterations in range(1, max_iterations + 1):
         last_v = current_v
-        current_v = np.dot(B, last_v)
+        current_v = apply_B(last_v)
         current_v = current_v / norm(current_v)
 
         if abs(np.dot(current_v, last_v)) > 1 - epsilon:
-            print("converged in {} iterations!".format(iterations))
+            logger.debug("converged in {} iterations!".format(iterations))
             return current_v
 
+    raise ConvergenceError(
+        "svd_1d did not converge in {} iterations".format(max_iterations))
+
+
+# Thread pools for row_blocked, shared across calls and keyed by size, so
+# that each matrix product doesn't pay to start new threads.
+thread_pools = dict()
+
+
+def thread_pool(workers):
+    if workers not in thread_pools:
+        thread_pools[workers] = ThreadPoolExecutor(max_workers=workers)
+    return thread_pools[workers]
+
+
+def row_partition(A, parts):
+    '''Split the rows of A into (at most) the given number of contiguous
+    blocks of roughly equal work: equal numbers of rows for an array, and
+    equal numbers of nonzero entries for a scipy.sparse CSR matrix.'''
+    n = A.shape[0]
+    if issparse(A):
+        targets = np.linspace(0, A.nnz, parts + 1)[1:-1]
+        boundaries = np.searchsorted(A.indptr, targets)
+    else:
+        boundaries = np.linspace(0, n, parts + 1)[1:-1].astype(int)
+    boundaries = np.unique(np.concatenate([[0], boundaries, [n]]))
+    return [slice(i, j) for (i, j) in zip(boundaries[:-1], boundaries[1:])]
+
+
+def row_blocked(A, block_size=None, workers=None):
+    '''Return a linear operator that multiplies by A (or its transpose) one
+    block of block_size rows at a time.
+
+    Only one block of rows is read into memory (and converted to float64)
+    at a time, which bounds the working set when A is a numpy.memmap of a
+    matrix too large to fit in memory.
+
+    If workers is not None, multiply the blocks in parallel on a pool of
+    that many threads. NumPy and scipy.sparse release the GIL while they
+    multiply, so the blocks really are multiplied at the same time. If
+    block_size is None, A is split into one block per worker, with equal
+    numbers of nonzero entries if A is sparse.
+    '''
+    n, m = A.shape
+    if block_size is None:
+        blocks = row_partition(A, workers or 1)
+    else:
+        blocks = [
+            slice(i, min(i + block_size, n)) for i in range(0, n, block_size)]
+
+    # slicing a memmap doesn't read it, and slicing a sparse matrix once
+    # here saves copying its rows at every product
+    pieces = [A[block] for block in blocks]
+    map_blocks = map if workers is None else thread_pool(workers).map
+
+    def matmat(x):
+        return np.concatenate(
+            list(map_blocks(lambda piece: piece.dot(x), pieces)))
+
+    def rmatmat(y):
+        result = np.zeros((m,) + y.shape[1:])
+        products = map_blocks(
+            lambda i: pieces[i].T.dot(y[blocks[i]]), range(len(blocks)))
+        for product in products:
+            result += product
+        return result
+
+    return ProductOperator(A.shape, matmat, rmatmat)
+
+
+class ProductOperator(LinearOperator):
+    '''A linear operator given by functions computing its product, and the
+    product of its transpose, with a vector or a matrix.
+
+    Unlike LinearOperator(matvec=..., rmatvec=...), products of the
+    transpose with a matrix are computed in one call instead of one column
+    at a time, and this doesn't need the rmatmat argument that older
+    versions of scipy lack.
+    '''
+
+    def __init__(self, shape, matmat, rmatmat):
+        super().__init__(dtype=np.dtype(float), shape=shape)
+        self.product = matmat
+        self.transpose_product = rmatmat
 
-def svd(A, k=None, epsilon=1e-10):
+    def _matvec(self, x):
+        return self.product(x)
+
+    def _matmat(self, x):
+        return self.product(x)
+
+    def _rmatvec(self, y):
+        return self.transpose_product(y)
+
+    def _adjoint(self):
+        n, m = self.shape
+        return ProductOperator((m, n), self.transpose_product, self.product)
+
+    _transpose = _adjoint
+
+
+def is_in_memory_float64(A):
+    '''Test whether A can be copied into a dense float64 array cheaply: A is
+    not a scipy.sparse matrix, a numpy.memmap, or a float32 array.'''
+    if issparse(A) or isinstance(A, np.memmap):
+        return False
+    return not (isinstance(A, np.ndarray) and A.dtype == np.float32)
+
+
+# The number of bytes of float64 rows that as_operand reads at a time from
+# a numpy.memmap or float32 array when no block_size is given.
+DEFAULT_BLOCK_BYTES = 2 ** 22
+
+
+def default_block_size(A):
+    '''Return the number of rows of A whose float64 copy takes about
+    DEFAULT_BLOCK_BYTES.'''
+    return max(1, DEFAULT_BLOCK_BYTES // (8 * max(A.shape[1], 1)))
+
+
+def as_operand(A, block_size=None, workers=None):
+    '''Prepare A for matrix products without copying it.
+
+    Sparse matrices and float64 arrays are used as they are, and anything
+    other than a float32 array is converted to a float64 array. If
+    block_size or workers is not None, return a row_blocked operator for A.
+
+    A float32 array or numpy.memmap is always multiplied in blocks of rows,
+    of default_block_size rows if block_size is None, because NumPy would
+    otherwise convert the whole of A to float64 at every product.
+    '''
+    if issparse(A):
+        if workers is None:
+            return A
+        return row_blocked(A.tocsr(), block_size, workers)
+    if not (isinstance(A, np.ndarray) and A.dtype in (np.float32, np.float64)):
+        A = np.asarray(A, dtype=float)
+    if block_size is None and not is_in_memory_float64(A):
+        block_size = default_block_size(A)
+    if block_size is not None or workers is not None:
+        return row_blocked(A, block_size, workers)
+    return A
+
+
+def deflate(A, svd_so_far):
+    '''Return a linear operator for A minus the rank-one terms
+    singular_value * outer(u, v) in svd_so_far, without forming the
+    difference as a (dense) matrix.
+    '''
+    if not svd_so_far:
+        return aslinearoperator(A)
+
+    singular_values, us, vs = [np.array(x) for x in zip(*svd_so_far)]
+
+    def matvec(x):
+        return A.dot(x) - np.dot(us.T, singular_values * np.dot(vs, x))
+
+    def rmatvec(y):
+        return A.T.dot(y) - np.dot(vs.T, singular_values * np.dot(us, y))
+
+    return LinearOperator(A.shape, matvec=matvec, rmatvec=rmatvec, dtype=float)
+
+
+def svd(A, k=None, epsilon=1e-10, gram_matrix=True, max_iterations=10000,
+        warm_start=None, random_state=None, block_size=None, workers=None):
     '''Compute the singular value decomposition of a matrix A using
     the power method.
 
@@ -53,32 +257,67 @@ def svd(A, k=None, epsilon=1e-10):
         k: the number of singular values to compute
            If k is None, compute the full-rank decomposition.
         epsilon: a tolerance factor
+        gram_matrix: passed to svd_1d. If False, previously found singular
+           vectors are subtracted implicitly rather than by copying A, so A
+           may be a scipy.sparse matrix and is never densified, and a
+           float32 array or numpy.memmap is used without making a copy.
+           This is always done (whatever gram_matrix is) when A is one of
+           those, or when block_size or workers is given.
+        max_iterations: passed to svd_1d.
+        warm_start: a tuple (S, u, v), as returned by a previous call to svd,
+           e.g., for a slightly different matrix. Its singular vectors are
+           used as the starting points of the power method.
+        random_state: passed to svd_1d.
+        block_size: multiply by A this many rows at a time (see
+           row_blocked). A numpy.memmap or float32 array is multiplied in
+           blocks of default_block_size rows if this is None.
+        workers: multiply by blocks of rows of A on this many threads (see
+           row_blocked).
 
     Returns:
         A tuple (S, u, v), where S is a list of singular values,
         u is an n-by-k matrix containing the left singular vectors,
         v is a k-by-m matrix containnig the right-singular-vectors
     '''
-    A = np.array(A, dtype=float)
+    if gram_matrix and (block_size is not None or workers is not None
+                        or not is_in_memory_float64(A)):
+        gram_matrix = False
+
+    if gram_matrix:
+        A = np.array(A, dtype=float)
+    else:
+        A = as_operand(A, block_size, workers)
     n, m = A.shape
     svd_so_far = []
     if k is None:
         k = min(n, m)
 
     for i in range(k):
-        matrix_for_1d = A.copy()
+        if gram_matrix:
+            matrix_for_1d = A.copy()
 
-        for singular_value, u, v in svd_so_far[:i]:
-            matrix_for_1d -= singular_value * np.outer(u, v)
+            for singular_value, u, v in svd_so_far[:i]:
+                matrix_for_1d -= singular_value * np.outer(u, v)
+        else:
+            matrix_for_1d = deflate(A, svd_so_far[:i])
+
+        initial_vector = None
+        if warm_start is not None and i < len(warm_start[0]):
+            initial_vector = warm_start[2][i] if n > m else warm_start[1][:, i]
+
+        options = dict(
+            epsilon=epsilon, gram_matrix=gram_matrix,
+            max_iterations=max_iterations, initial_vector=initial_vector,
+            random_state=random_state)
 
         if n > m:
-            v = svd_1d(matrix_for_1d, epsilon=epsilon)  # next singular vector
-            u_unnormalized = np.dot(A, v)
+            v = svd_1d(matrix_for_1d, **options)  # next singular vector
+            u_unnormalized = A.dot(v)
             sigma = norm(u_unnormalized)  # next singular value
             u = u_unnormalized / sigma
         else:
-            u = svd_1d(matrix_for_1d, epsilon=epsilon)  # next singular vector
-            v_unnormalized = np.dot(A.T, u)
+            u = svd_1d(matrix_for_1d, **options)  # next singular vector
+            v_unnormalized = A.T.dot(u)
             sigma = norm(v_unnormalized)  # next singular value
             v = v_unnormalized / sigma
 
@@ -86,3 +325,169 @@ def svd(A, k=None, epsilon=1e-10):
 
     singular_values, us, vs = [np.array(x) for x in zip(*svd_so_far)]
     return singular_values, us.T, vs
+
+
+def orthonormal_basis(M):
+    '''Return a matrix whose columns are an orthonormal basis for the column
+    space of M, computed via a (reduced) QR decomposition.'''
+    Q, _ = np.linalg.qr(M)
+    return Q
+
+
+def rayleigh_ritz(A, U):
+    '''Compute the SVD of A restricted to the span of the orthonormal columns
+    of U, i.e., the exact SVD of the small matrix U^T A, mapped back to the
+    original space.'''
+    B = A.T.dot(U).T
+    small_u, singular_values, vs = np.linalg.svd(B, full_matrices=False)
+    return singular_values, np.dot(U, small_u), vs
+
+
+# Singular values smaller than this fraction of the largest one are treated
+# as zero when svd_block tests for convergence.
+RANK_TOLERANCE = 1e-10
+
+
+def svd_block(A, k=None, epsilon=1e-10, max_iterations=10000,
+              warm_start=None, random_state=None, block_size=None,
+              workers=None):
+    '''Compute the singular value decomposition of a matrix A using block
+    power iteration (also called subspace iteration).
+
+    Instead of finding one singular vector at a time, iterate on k vectors at
+    once, re-orthonormalizing them after each step so they don't all collapse
+    onto the top singular vector. Each step is two matrix-matrix products,
+    and the method converges quickly even when the top singular values are
+    close together. A may have rank less than k; the extra singular values
+    are then (close to) zero.
+
+    Arguments:
+        A: an n-by-m matrix, numpy.memmap, or scipy.sparse matrix
+        k: the number of singular values to compute
+           If k is None, compute the full-rank decomposition.
+        epsilon: a tolerance factor
+        max_iterations, warm_start, random_state, block_size, workers: as
+            in svd.
+
+    Returns:
+        A tuple (S, u, v) as in svd.
+    '''
+    A = as_operand(A, block_size, workers)
+    n, m = A.shape
+    if k is None:
+        k = min(n, m)
+
+    initial_v = random_normal((m, k), random_state)
+    if warm_start is not None:
+        previous_vs = warm_start[2][:k]
+        initial_v[:, :len(previous_vs)] = previous_vs.T
+    current_v = orthonormal_basis(initial_v)
+
+    for iterations in range(1, max_iterations + 1):
+        last_v = current_v
+        u = orthonormal_basis(A.dot(last_v))
+        current_v, singular_values, _ = np.linalg.svd(
+            A.T.dot(u), full_matrices=False)
+
+        # If A has rank less than k, the directions with (numerically) zero
+        # singular values are a new arbitrary basis of the null space at
+        # every step and never converge, so only test the others: converge
+        # when they lie in the span of the old subspace.
+        significant = singular_values > RANK_TOLERANCE * singular_values[0]
+        cosines = np.linalg.svd(
+            np.dot(last_v.T, current_v[:, significant]), compute_uv=False)
+        if min(cosines, default=1) > 1 - epsilon:
+            logger.debug("converged in {} iterations!".format(iterations))
+            return rayleigh_ritz(A, orthonormal_basis(A.dot(current_v)))
+
+    raise ConvergenceError(
+        "svd_block did not converge in {} iterations".format(max_iterations))
+
+
+def randomized_svd(A, k, oversampling=10, power_iterations=2,
+                   random_state=None, block_size=None, workers=None):
+    '''Compute an approximate top-k singular value decomposition of a matrix A
+    using a randomized range finder.
+
+    Multiply A by a random matrix with k + oversampling columns to get a
+    sample of A's column space, sharpen it with a few passes of block power
+    iteration, and then compute the exact SVD of A restricted to that sample.
+
+    Arguments:
+        A: an n-by-m matrix, numpy.memmap, or scipy.sparse matrix
+        k: the number of singular values to compute
+        oversampling: the number of extra random vectors to sample
+        power_iterations: the number of block power iteration passes
+        random_state, block_size, workers: as in svd.
+
+    Returns:
+        A tuple (S, u, v) as in svd.
+    '''
+    A = as_operand(A, block_size, workers)
+    n, m = A.shape
+    sample_size = min(k + oversampling, n, m)
+
+    u = orthonormal_basis(A.dot(random_normal((m, sample_size), random_state)))
+    for _ in range(power_iterations):
+        v = orthonormal_basis(A.T.dot(u))
+        u = orthonormal_basis(A.dot(v))
+
+    singular_values, us, vs = rayleigh_ritz(A, u)
+    return singular_values[:k], us[:, :k], vs[:k]
+
+
+def svd_update(singular_values, U, new_columns, k=None):
+    '''Update a (truncated) singular value decomposition of a matrix A to
+    one of the matrix [A, C] obtained by appending new columns C to A.
+
+    Only the singular values and left singular vectors are updated, which
+    is all that is needed to project columns onto the top singular vectors.
+    The new columns are split into their components inside and outside the
+    span of U, and the SVD of the resulting small (k + c)-by-(k + c) matrix
+    is used to rotate U. The matrix U may have zero columns, in which
+    case this computes the SVD of C. This is exact when A = U diag(S) V, and otherwise
+    approximates the SVD of [U diag(S) V, C].
+
+    Arguments:
+        singular_values: the list of k singular values of A
+        U: an n-by-k matrix containing the left singular vectors of A
+        new_columns: an n-by-c matrix C of columns to append to A
+        k: the number of singular values to keep. If k is None, keep
+           as many as the input has.
+
+    Returns:
+        A pair (S, u) of the new singular values and left singular vectors.
+    '''
+    if k is None:
+        k = len(singular_values)
+    new_columns = np.asarray(new_columns, dtype=float)
+    old_k = len(singular_values)
+
+    projections = np.dot(U.T, new_columns)
+    residuals = new_columns - np.dot(U, projections)
+    residual_basis, residual_coefficients = np.linalg.qr(residuals)
+
+    middle = np.zeros((old_k + len(residual_coefficients),
+                       old_k + new_columns.shape[1]))
+    middle[:old_k, :old_k] = np.diag(singular_values)
+    middle[:old_k, old_k:] = projections
+    middle[old_k:, old_k:] = residual_coefficients
+    small_u, new_singular_values, _ = np.linalg.svd(middle, full_matrices=False)
+
+    new_u = np.dot(np.hstack([U, residual_basis]), small_u[:, :k])
+    return new_singular_values[:k], new_u
+
+
+def sparse_svd(A, k, workers=None):
+    '''Compute the top-k singular value decomposition of A with
+    scipy.sparse.linalg.svds, a Lanczos-based truncated solver that only
+    needs matrix-vector products with A. If workers is not None, the
+    products are split across that many threads, as in svd.
+
+    Requires k < min(n, m). Returns a tuple (S, u, v) as in svd.
+    '''
+    us, singular_values, vs = svds(as_operand(A, workers=workers), k=k)
+
+    # svds returns the singular values in increasing order
+    order = np.argsort(singular_values)[::-1]
+    return singular_values[order], us[:, order], vs[order]
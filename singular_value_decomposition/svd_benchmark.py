@@ -0,0 +1,175 @@
+'''Benchmark the power-method SVD implementations in svd.py against
+numpy.linalg.svd.
+
+For each test matrix (varying the shape, rank, sparsity and the gap between
+consecutive singular values) and each method, report the wall time, the
+total number of power-method iterations, the peak memory allocated, the
+relative reconstruction error ||A - U S V|| / ||A|| (Frobenius norm), and the
+subspace error: the sine of the largest angle between the computed top-k
+left singular subspace and the one computed by numpy.
+
+Run with `python svd_benchmark.py`.
+'''
+import logging
+import numpy as np
+import re
+import time
+import tracemalloc
+from collections import namedtuple
+from scipy.sparse import issparse
+from scipy.sparse import random as sparse_random
+
+import svd
+
+
+BenchmarkCase = namedtuple(
+    'BenchmarkCase', ['shape', 'rank', 'density', 'gap', 'k'])
+
+
+CASES = [
+    BenchmarkCase(shape=(200, 100), rank=100, density=1.0, gap=0.9, k=10),
+    BenchmarkCase(shape=(200, 100), rank=100, density=1.0, gap=0.99, k=10),
+    BenchmarkCase(shape=(100, 400), rank=20, density=1.0, gap=0.8, k=10),
+    BenchmarkCase(shape=(2000, 500), rank=500, density=1.0, gap=0.9, k=10),
+    BenchmarkCase(shape=(5000, 1000), rank=None, density=0.01, gap=None, k=10),
+    BenchmarkCase(shape=(5000, 1000), rank=None, density=0.001, gap=None, k=10),
+]
+
+
+def make_matrix(case, random_state):
+    '''Make a test matrix for a BenchmarkCase.
+
+    Dense matrices have the given rank, with singular values decaying
+    geometrically by a factor of case.gap. Sparse matrices (density < 1)
+    have uniformly random nonzero entries at random positions.
+    '''
+    n, m = case.shape
+    if case.density < 1:
+        return sparse_random(
+            n, m, density=case.density, format='csr', random_state=random_state)
+
+    rank = min(case.rank, n, m)
+    left, _ = np.linalg.qr(random_state.standard_normal((n, rank)))
+    right, _ = np.linalg.qr(random_state.standard_normal((m, rank)))
+    singular_values = case.gap ** np.arange(rank)
+    return np.dot(left * singular_values, right.T)
+
+
+def numpy_svd(A, k):
+    A = A.toarray() if issparse(A) else A
+    U, singular_values, V = np.linalg.svd(A, full_matrices=False)
+    return singular_values[:k], U[:, :k], V[:k]
+
+
+METHODS = [
+    ('numpy', numpy_svd),
+    ('power', lambda A, k: svd.svd(A.toarray() if issparse(A) else A, k=k)),
+    ('power (no gram)', lambda A, k: svd.svd(A, k=k, gram_matrix=False)),
+    ('power (4 threads)',
+     lambda A, k: svd.svd(A, k=k, gram_matrix=False, workers=4)),
+    ('block', lambda A, k: svd.svd_block(A, k=k)),
+    ('randomized', lambda A, k: svd.randomized_svd(A, k=k)),
+    ('sparse', svd.sparse_svd),
+]
+
+
+class IterationCounter(logging.Handler):
+    '''Count power-method iterations from svd's convergence log messages.'''
+
+    def __init__(self):
+        super().__init__(level=logging.DEBUG)
+        self.iterations = 0
+        self.converged = 0
+
+    def emit(self, record):
+        match = re.search(r'converged in (\d+) iterations', record.getMessage())
+        if match:
+            self.iterations += int(match.group(1))
+            self.converged += 1
+
+
+def reconstruction_error(A, result):
+    singular_values, U, V = result
+    A = A.toarray() if issparse(A) else A
+    reconstructed = np.dot(U * singular_values, V)
+    return np.linalg.norm(A - reconstructed) / np.linalg.norm(A)
+
+
+def subspace_error(U, expected_U):
+    '''Return the sine of the largest principal angle between the column
+    spaces of U and expected_U (both with orthonormal columns).'''
+    cosines = np.linalg.svd(np.dot(expected_U.T, U), compute_uv=False)
+    return np.sqrt(max(0, 1 - min(cosines) ** 2))
+
+
+def run_method(method, A, k):
+    '''Run one SVD method, returning (result, seconds, iterations, peak
+    bytes allocated).'''
+    counter = IterationCounter()
+    svd.logger.addHandler(counter)
+    previous_level = svd.logger.level
+    svd.logger.setLevel(logging.DEBUG)
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = method(A, k)
+        seconds = time.perf_counter() - start
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        svd.logger.setLevel(previous_level)
+        svd.logger.removeHandler(counter)
+
+    iterations = counter.iterations if counter.converged else None
+    return result, seconds, iterations, peak_bytes
+
+
+def run_benchmarks(cases=CASES, methods=METHODS, seed=0):
+    '''Run each method on each case, returning a list of result rows.'''
+    rows = []
+    for case in cases:
+        A = make_matrix(case, np.random.RandomState(seed))
+        expected_U = None
+
+        for name, method in methods:
+            result, seconds, iterations, peak_bytes = run_method(
+                method, A, case.k)
+            if expected_U is None:
+                expected_U = result[1]
+
+            rows.append({
+                'case': case,
+                'method': name,
+                'seconds': seconds,
+                'iterations': iterations,
+                'peak_megabytes': peak_bytes / 2 ** 20,
+                'reconstruction_error': reconstruction_error(A, result),
+                'subspace_error': subspace_error(result[1], expected_U),
+            })
+
+    return rows
+
+
+def format_case(case):
+    n, m = case.shape
+    if case.density < 1:
+        return '{}x{} density={} k={}'.format(n, m, case.density, case.k)
+    return '{}x{} rank={} gap={} k={}'.format(n, m, case.rank, case.gap, case.k)
+
+
+def print_table(rows):
+    header = '{:<38} {:<18} {:>9} {:>10} {:>9} {:>14} {:>10}'.format(
+        'case', 'method', 'seconds', 'iterations', 'peak MB',
+        'reconstruction', 'subspace')
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print('{:<38} {:<18} {:>9.3f} {:>10} {:>9.1f} {:>14.2e} {:>10.2e}'.format(
+            format_case(row['case']), row['method'], row['seconds'],
+            '-' if row['iterations'] is None else row['iterations'],
+            row['peak_megabytes'], row['reconstruction_error'],
+            row['subspace_error']))
+
+
+if __name__ == "__main__":
+    print_table(run_benchmarks())
@@ -1,7 +1,19 @@
 from assertpy import assert_that
 import numpy
+import os
+import pytest
+import tempfile
+import tracemalloc
+import scipy.sparse
 
+from svd import ConvergenceError
+from svd import is_in_memory_float64
+from svd import randomized_svd
+from svd import row_blocked
 from svd import svd
+from svd import svd_block
+from svd import svd_update
+from svd import svd_1d
 
 EPSILON = 1e-9
 
@@ -68,3 +80,252 @@ def test_1_by_1():
     else:
         assert_that(us[0]).is_equal_to([1.0])
         assert_that(vs[0]).is_equal_to([1.0])
+
+
+def test_svd_1d_without_gram_matrix():
+    matrix = numpy.array([
+        [2, 5, 3],
+        [1, 2, 1],
+        [4, 1, 1],
+        [3, 5, 2],
+        [5, 3, 1],
+        [4, 5, 5],
+        [2, 4, 2],
+        [2, 2, 5],
+    ], dtype='float64')
+
+    for A in [matrix, matrix.T]:
+        expected = svd_1d(A, gram_matrix=True)
+        actual = svd_1d(A, gram_matrix=False)
+        if numpy.dot(expected, actual) < 0:
+            actual = -actual
+
+        for (a, b) in zip(actual, expected):
+            assert_that(a).is_close_to(b, 1e-5)
+
+
+def test_sparse_svd_without_gram_matrix():
+    matrix = scipy.sparse.csr_matrix(numpy.array([
+        [2, 0, 3],
+        [0, 2, 0],
+        [4, 0, 0],
+        [0, 5, 2],
+        [5, 0, 1],
+        [0, 0, 5],
+        [2, 4, 0],
+        [0, 2, 0],
+    ], dtype='float64'))
+
+    singular_values, us, vs = svd(matrix, gram_matrix=False)
+    reconstructed_matrix = numpy.dot(
+        us, numpy.dot(numpy.diag(singular_values), vs))
+
+    flattened_original = matrix.toarray().flatten()
+    flattened_actual = reconstructed_matrix.flatten()
+
+    for (a, b) in zip(flattened_actual, flattened_original):
+        assert_that(a).is_close_to(b, 1e-6)
+
+
+def test_svd_block_reconstruct_matrix():
+    matrix = numpy.array([
+        [2, 5, 3],
+        [1, 2, 1],
+        [4, 1, 1],
+        [3, 5, 2],
+        [5, 3, 1],
+        [4, 5, 5],
+        [2, 4, 2],
+        [2, 2, 5],
+    ], dtype='float64')
+
+    for A in [matrix, matrix.T]:
+        singular_values, us, vs = svd_block(A)
+        reconstructed_matrix = numpy.dot(
+            us, numpy.dot(numpy.diag(singular_values), vs))
+
+        for (a, b) in zip(reconstructed_matrix.flatten(), A.flatten()):
+            assert_that(a).is_close_to(b, EPSILON)
+
+
+def test_svd_block_of_rank_deficient_matrix():
+    matrix = numpy.outer(numpy.arange(1, 7.), numpy.arange(1, 5.))
+    expected_singular_values = numpy.linalg.svd(matrix, compute_uv=False)
+
+    for k in [3, None]:
+        singular_values, us, vs = svd_block(matrix, k=k)
+        numpy.testing.assert_allclose(
+            singular_values, expected_singular_values[:len(singular_values)],
+            atol=1e-9)
+        reconstructed_matrix = numpy.dot(
+            us, numpy.dot(numpy.diag(singular_values), vs))
+        numpy.testing.assert_allclose(reconstructed_matrix, matrix, atol=1e-9)
+
+
+def test_svd_block_and_randomized_svd_top_k():
+    numpy.random.seed(1)
+    low_rank = numpy.dot(numpy.random.standard_normal((60, 3)),
+                         numpy.random.standard_normal((3, 40)))
+    matrix = low_rank + 1e-3 * numpy.random.standard_normal((60, 40))
+    expected_singular_values = numpy.linalg.svd(matrix, compute_uv=False)
+
+    for method in [svd_block, randomized_svd]:
+        singular_values, us, vs = method(matrix, k=3)
+        assert_that(us.shape).is_equal_to((60, 3))
+        assert_that(vs.shape).is_equal_to((3, 40))
+        for (a, b) in zip(singular_values, expected_singular_values[:3]):
+            assert_that(a).is_close_to(b, 1e-6)
+
+
+def test_svd_update_appending_columns():
+    numpy.random.seed(1)
+    matrix = numpy.random.standard_normal((10, 4))
+    expected_singular_values = numpy.linalg.svd(matrix, compute_uv=False)
+
+    us, singular_values, _ = numpy.linalg.svd(matrix[:, :2], full_matrices=False)
+    singular_values, us = svd_update(singular_values, us, matrix[:, 2:], k=4)
+
+    for (a, b) in zip(singular_values, expected_singular_values):
+        assert_that(a).is_close_to(b, EPSILON)
+
+    reconstructed_matrix = numpy.dot(us, numpy.dot(us.T, matrix))
+    for (a, b) in zip(reconstructed_matrix.flatten(), matrix.flatten()):
+        assert_that(a).is_close_to(b, EPSILON)
+
+
+def test_svd_1d_max_iterations():
+    matrix = numpy.diag([1.0, 0.9999, 0.5])
+    with pytest.raises(ConvergenceError):
+        svd_1d(matrix, max_iterations=2)
+
+
+def test_svd_1d_random_state():
+    numpy.random.seed(1)
+    matrix = numpy.random.standard_normal((6, 4))
+    v1 = svd_1d(matrix, epsilon=1e-2, random_state=numpy.random.RandomState(3))
+    v2 = svd_1d(matrix, epsilon=1e-2, random_state=numpy.random.RandomState(3))
+    assert_that(list(v1)).is_equal_to(list(v2))
+
+
+def test_svd_warm_start():
+    numpy.random.seed(1)
+    matrix = numpy.random.standard_normal((8, 5))
+    previous = svd(matrix, k=3)
+
+    # starting from the answer, each singular vector converges immediately
+    perturbed = matrix + 1e-12 * numpy.random.standard_normal((8, 5))
+    singular_values, _, _ = svd(
+        perturbed, k=3, warm_start=previous, max_iterations=2)
+    for (a, b) in zip(singular_values, previous[0]):
+        assert_that(a).is_close_to(b, 1e-6)
+
+    singular_values, _, _ = svd_block(
+        perturbed, k=3, warm_start=previous, max_iterations=2)
+    for (a, b) in zip(singular_values, previous[0]):
+        assert_that(a).is_close_to(b, 1e-6)
+
+
+def test_row_blocked():
+    numpy.random.seed(1)
+    matrix = numpy.random.standard_normal((7, 4))
+    operator = row_blocked(matrix, block_size=3)
+    x = numpy.random.standard_normal(4)
+    y = numpy.random.standard_normal((7, 2))
+
+    for (a, b) in zip(operator.dot(x), numpy.dot(matrix, x)):
+        assert_that(a).is_close_to(b, EPSILON)
+    actual = operator.T.dot(y).flatten()
+    for (a, b) in zip(actual, numpy.dot(matrix.T, y).flatten()):
+        assert_that(a).is_close_to(b, EPSILON)
+
+
+def test_row_blocked_threads():
+    numpy.random.seed(1)
+    dense = numpy.random.standard_normal((50, 6))
+    dense[dense < 1] = 0
+    x = numpy.random.standard_normal(6)
+    y = numpy.random.standard_normal((50, 3))
+
+    for matrix in [dense, scipy.sparse.csr_matrix(dense)]:
+        for block_size in [None, 7]:
+            operator = row_blocked(matrix, block_size=block_size, workers=4)
+            numpy.testing.assert_allclose(
+                operator.dot(x), dense.dot(x), atol=EPSILON)
+            numpy.testing.assert_allclose(
+                operator.T.dot(y), dense.T.dot(y), atol=EPSILON)
+
+
+def test_svd_with_workers():
+    numpy.random.seed(1)
+    matrix = scipy.sparse.random(60, 20, density=0.3, format='csr')
+    expected = numpy.linalg.svd(matrix.toarray(), compute_uv=False)[:3]
+
+    results = [
+        svd(matrix, k=3, gram_matrix=False, workers=3),
+        svd_block(matrix, k=3, workers=3),
+    ]
+    for singular_values, _, _ in results:
+        numpy.testing.assert_allclose(singular_values, expected, rtol=1e-6)
+
+
+def test_svd_of_float32_memmap():
+    numpy.random.seed(1)
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'matrix.dat')
+    try:
+        matrix = numpy.memmap(filename, dtype='float32', mode='w+', shape=(9, 4))
+        matrix[:] = numpy.random.standard_normal((9, 4))
+        expected_singular_values = numpy.linalg.svd(matrix, compute_uv=False)
+
+        # svd switches to the matrix-free method by itself for a memmap
+        for method in [svd, svd_block, randomized_svd]:
+            singular_values, us, vs = method(matrix, k=4, block_size=2)
+            for (a, b) in zip(singular_values, expected_singular_values):
+                assert_that(a).is_close_to(b, 1e-5)
+        del matrix
+    finally:
+        os.remove(filename)
+        os.rmdir(tmpdir)
+
+
+def test_svd_of_float32_memmap_in_bounded_memory():
+    random_state = numpy.random.RandomState(1)
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'matrix.dat')
+    try:
+        shape = (6000, 500)
+        matrix = numpy.memmap(filename, dtype='float32', mode='w+', shape=shape)
+        matrix[:] = numpy.dot(
+            random_state.standard_normal((shape[0], 2)) * [10, 5],
+            random_state.standard_normal((2, shape[1])))
+
+        # a float64 copy of the matrix would take 24 MB
+        for method in [svd, svd_block, randomized_svd]:
+            tracemalloc.start()
+            try:
+                method(matrix, k=2)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            assert_that(peak).is_less_than(matrix.nbytes)
+        del matrix
+    finally:
+        os.remove(filename)
+        os.rmdir(tmpdir)
+
+
+def test_is_in_memory_float64():
+    assert_that(is_in_memory_float64(numpy.ones((2, 2)))).is_true()
+    assert_that(is_in_memory_float64([[1, 2], [3, 4]])).is_true()
+    assert_that(is_in_memory_float64(
+        numpy.ones((2, 2), dtype=numpy.float32))).is_false()
+    assert_that(is_in_memory_float64(
+        scipy.sparse.csr_matrix(numpy.ones((2, 2))))).is_false()
+
+
+def test_svd_of_sparse_matrix_with_default_options():
+    numpy.random.seed(1)
+    matrix = scipy.sparse.random(30, 10, density=0.3, format='csr')
+    expected = numpy.linalg.svd(matrix.toarray(), compute_uv=False)[:2]
+    singular_values, _, _ = svd(matrix, k=2)
+    numpy.testing.assert_allclose(singular_values, expected, rtol=1e-6)
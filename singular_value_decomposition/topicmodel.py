@@ -3,40 +3,204 @@ applied to a corpus of CNN stories.
 '''
 import json
 import numpy as np
+import os
+from array import array
 from collections import Counter
-from scipy.cluster.vq import kmeans2
+from collections import namedtuple
+from scipy.sparse import csr_matrix
+from scipy.sparse import issparse
+from scipy.special import xlogy
 
 # from numpy.linalg import svd
+from clustering import group_by_label
+from clustering import kmeans
+from clustering import minibatch_kmeans
+from corpus import Corpus
+from svd import randomized_svd
+from svd import sparse_svd
 from svd import svd
+from svd import svd_block
+from svd import svd_update
 
 
-def normalize(matrix):
+TermStatistics = namedtuple(
+    'TermStatistics',
+    ['row_sums', 'count_entropy_sums', 'document_frequencies',
+     'document_lengths'])
+
+
+def canonical_csr(matrix):
+    '''Convert a scipy.sparse matrix to CSR format with at most one entry
+    per position, summing any duplicate entries, so that each stored entry
+    is a word's whole count in a document.'''
+    matrix = csr_matrix(matrix)
+    matrix.sum_duplicates()
+    return matrix
+
+
+def term_statistics(matrix, block_size=1024):
+    '''Compute the statistics of a document term matrix of word counts that
+    the weighting schemes in normalize need, in a single pass over its
+    entries (only the nonzero entries, if the matrix is sparse).
+
+    Returns:
+        A TermStatistics tuple of arrays: for each word (row), the total
+        count, the sum of c log(c) over its counts c, and the number of
+        documents containing it; and for each document (column), its length.
+    '''
+    if issparse(matrix):
+        matrix = canonical_csr(matrix)
+        num_words, num_docs = matrix.shape
+        rows = np.repeat(np.arange(num_words), np.diff(matrix.indptr))
+        return TermStatistics(
+            np.bincount(rows, weights=matrix.data, minlength=num_words),
+            np.bincount(rows, weights=xlogy(matrix.data, matrix.data),
+                        minlength=num_words),
+            np.bincount(rows, weights=matrix.data > 0, minlength=num_words),
+            np.bincount(matrix.indices, weights=matrix.data,
+                        minlength=num_docs))
+
+    num_words, num_docs = matrix.shape
+    statistics = TermStatistics(
+        np.zeros(num_words), np.zeros(num_words), np.zeros(num_words),
+        np.zeros(num_docs))
+
+    # work a block of rows at a time, to bound the size of temporaries
+    for i in range(0, num_words, block_size):
+        block = matrix[i:i + block_size]
+        statistics.row_sums[i:i + block_size] = np.sum(block, axis=1)
+        statistics.count_entropy_sums[i:i + block_size] = np.sum(
+            xlogy(block, block), axis=1)
+        statistics.document_frequencies[i:i + block_size] = np.count_nonzero(
+            block, axis=1)
+        statistics.document_lengths[:] += np.sum(block, axis=0)
+
+    return statistics
+
+
+WEIGHTINGS = ('log-entropy', 'tf-idf', 'bm25')
+
+# The parameters of the BM25 weighting scheme
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def global_factors(statistics, num_docs, weighting='log-entropy'):
+    '''Compute the global normalization factor of each word for a weighting
+    scheme, given the TermStatistics of the document term matrix.'''
+    if weighting == 'log-entropy':
+        if np.any(statistics.row_sums <= 0):
+            raise ValueError("Every word must occur in some document.")
+        return entropy_global_factors(
+            statistics.row_sums, statistics.count_entropy_sums, num_docs)
+
+    frequencies = statistics.document_frequencies
+    if weighting == 'tf-idf':
+        return np.log(num_docs / np.maximum(frequencies, 1))
+    if weighting == 'bm25':
+        return np.log1p((num_docs - frequencies + 0.5) / (frequencies + 0.5))
+
+    raise ValueError("Unknown weighting {}, expected one of {}".format(
+        weighting, WEIGHTINGS))
+
+
+def average_document_length(statistics):
+    '''The average document length that BM25 measures lengths against.'''
+    return max(np.mean(statistics.document_lengths), 1)
+
+
+def apply_local_weights(counts, columns, statistics, weighting,
+                        average_length=None):
+    '''Replace word counts by their local weights in place.
+
+    Arguments:
+        counts: an array of word counts, which is overwritten
+        columns: the document index of each count, or None if counts is a
+            block of rows of a dense document term matrix
+        average_length: the average document length for BM25, by default
+            that of the documents in statistics
+    '''
+    if weighting == 'log-entropy':
+        np.log1p(counts, out=counts)
+    elif weighting == 'bm25':
+        lengths = statistics.document_lengths
+        if average_length is None:
+            average_length = average_document_length(statistics)
+        saturation = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length)
+        if columns is not None:
+            saturation = saturation[columns]
+        np.divide(counts * (BM25_K1 + 1), counts + saturation, out=counts)
+
+    # tf-idf uses the raw counts
+
+
+def normalize(matrix, weighting='log-entropy', in_place=False, block_size=1024,
+              statistics=None, factors=None):
     '''Normalize a document term matrix according to a local and
     global normalization factor.
 
-    For this we chose a simple logarithmic local normalization
-    with a global normalization based on entropy.
+    By default we chose a simple logarithmic local normalization
+    with a global normalization based on entropy. The weighting argument
+    selects a different scheme:
+
+        'log-entropy': log(1 + count) times 1 + sum_j p_ij log(p_ij) / log(n)
+        'tf-idf': count times log(n / document frequency)
+        'bm25': the saturated count of Okapi BM25 times its idf
+
+    The statistics for the global factors are computed in one pass (see
+    term_statistics), and the local weights are then applied in place, one
+    block of rows at a time, so the only full-size allocation is the output
+    (and not even that if in_place is True and matrix is a float array or a
+    scipy.sparse matrix with float entries). If the input is sparse, so is
+    the output, with the same nonzero entries.
+
+    A caller that already has the TermStatistics of matrix, or the global
+    factors computed from them, can pass them in to skip that pass.
     '''
     num_words, num_docs = matrix.shape
-    local_factors = np.log(np.ones(matrix.shape) + matrix.copy())
+    if issparse(matrix):
+        matrix = canonical_csr(matrix)
+    if statistics is None:
+        statistics = term_statistics(matrix, block_size=block_size)
+    if factors is None:
+        factors = global_factors(statistics, num_docs, weighting=weighting)
+
+    if issparse(matrix):
+        if not (in_place and matrix.dtype == float):
+            matrix = matrix.astype(float)
+        rows = np.repeat(np.arange(num_words), np.diff(matrix.indptr))
+        apply_local_weights(matrix.data, matrix.indices, statistics, weighting)
+        matrix.data *= factors[rows]
+        return matrix
+
+    if not (in_place and isinstance(matrix, np.ndarray) and matrix.dtype == float):
+        matrix = np.array(matrix, dtype=float)
+
+    for i in range(0, num_words, block_size):
+        block = matrix[i:i + block_size]
+        apply_local_weights(block, None, statistics, weighting)
+        block *= factors[i:i + block_size, np.newaxis]
 
-    probabilities = matrix.copy()
-    row_sums = np.sum(matrix, axis=1)
+    return matrix
 
-    # divide each column by the row sums
-    assert all(x > 0 for x in row_sums)
-    probabilities = (probabilities.T / row_sums).T
 
-    entropies = (probabilities * np.ma.log(probabilities).filled(0) /
-                 np.log(num_docs))
-    global_factors = np.ones(num_words) + np.sum(entropies, axis=1)
+def entropy_global_factors(row_sums, count_entropy_sums, num_docs):
+    '''Compute the entropy-based global normalization factors of normalize
+    from per-word summary statistics.
 
-    # multiply each column by the global factors for the rows
-    normalized_matrix = (local_factors.T * global_factors).T
-    return normalized_matrix
+    If word i occurs c_ij times in document j and R_i times in total, then
+    with p_ij = c_ij / R_i,
 
+        sum_j p_ij log(p_ij) = (sum_j c_ij log(c_ij)) / R_i - log(R_i)
 
-def make_document_term_matrix(documents):
+    so it suffices to know R_i (row_sums) and sum_j c_ij log(c_ij)
+    (count_entropy_sums), both of which can be updated as documents arrive.
+    '''
+    entropies = (count_entropy_sums / row_sums - np.log(row_sums)) / np.log(num_docs)
+    return np.ones(len(row_sums)) + entropies
+
+
+def make_document_term_matrix(documents, sparse=False):
     '''Return the document-term matrix for the given list of stories.
 
     Arguments:
@@ -49,6 +213,9 @@ def make_document_term_matrix(documents):
 
         The list of words include repetition.
 
+        sparse: if True, return a scipy.sparse CSR matrix, whose memory
+        usage scales with the number of nonzero entries.
+
     Returns:
         A document-term matrix. Entry [i, j] is the count of word i
         in story j.
@@ -58,6 +225,20 @@ def make_document_term_matrix(documents):
     index_to_word = dict(enumerate(words))
     index_to_document = dict(enumerate(documents))
 
+    if sparse:
+        rows, columns, counts = [], [], []
+        for doc_id, document in enumerate(documents):
+            doc_words = Counter(document['words'])
+            for word, count in doc_words.items():
+                rows.append(word_to_index[word])
+                columns.append(doc_id)
+                counts.append(count)
+
+        matrix = csr_matrix(
+            (np.array(counts, dtype=float), (rows, columns)),
+            shape=(len(words), len(documents)))
+        return matrix, (index_to_word, index_to_document)
+
     matrix = np.zeros((len(words), len(documents)))
     for doc_id, document in enumerate(documents):
         doc_words = Counter(document['words'])
@@ -67,9 +248,21 @@ def make_document_term_matrix(documents):
     return matrix, (index_to_word, index_to_document)
 
 
-def cluster(vectors):
-    print(vectors)
-    return kmeans2(vectors, k=len(vectors[0]))
+# Above this many vectors, cluster with mini-batch k-means.
+MINIBATCH_THRESHOLD = 10000
+
+
+def cluster(vectors, restarts=4, workers=None):
+    '''Cluster the rows of vectors into as many clusters as there are
+    columns, returning a pair (centers, labels).
+
+    Below MINIBATCH_THRESHOLD vectors, the best of restarts runs of kmeans is
+    kept, running on workers threads. Above it, a single run of mini-batch
+    k-means is used.'''
+    k = len(vectors[0])
+    if len(vectors) > MINIBATCH_THRESHOLD:
+        return minibatch_kmeans(vectors, k)
+    return kmeans(vectors, k, restarts=restarts, workers=workers)
 
 
 def all_words(documents):
@@ -81,11 +274,161 @@ def all_words(documents):
 
 
 def load(filename='all_stories.json'):
+    '''Load the documents written by data/cleaner.py, either from a JSON
+    file or from a corpus directory written by corpus.py. A Corpus reads
+    document texts from disk only as they are accessed.'''
+    if os.path.isdir(filename):
+        return Corpus(filename)
+
     with open(filename, 'r') as infile:
         return json.loads(infile.read())
 
 
-def cluster_stories(documents, k=10):
+def load_document_term_matrix(filename='all_stories.jsonl'):
+    '''Build a sparse document term matrix from a JSON Lines file in a
+    single pass, without holding the documents in memory.
+
+    Arguments:
+        filename: a file containing one JSON document per line, each of the
+        form accepted by make_document_term_matrix.
+
+    Returns:
+        A pair (matrix, (index_to_word, index_to_offset)), like the output of
+        make_document_term_matrix with sparse=True, except that documents are
+        represented by the byte offset of their line in the file. Pass an
+        offset to read_document to get the document back.
+    '''
+    word_to_index = dict()
+    rows, columns, counts = array('q'), array('q'), array('d')
+    offsets = []
+
+    with open(filename, 'rb') as infile:
+        offset = 0
+        for line in infile:
+            if line.strip():
+                doc_id = len(offsets)
+                offsets.append(offset)
+                for word, count in Counter(json.loads(line)['words']).items():
+                    rows.append(word_to_index.setdefault(word, len(word_to_index)))
+                    columns.append(doc_id)
+                    counts.append(count)
+            offset += len(line)
+
+    # Renumber the words in sorted order, to agree with all_words.
+    words = sorted(word_to_index)
+    sorted_index = np.empty(len(words), dtype=int)
+    for i, word in enumerate(words):
+        sorted_index[word_to_index[word]] = i
+
+    matrix = csr_matrix(
+        (np.asarray(counts), (sorted_index[np.asarray(rows)], np.asarray(columns))),
+        shape=(len(words), len(offsets)))
+    return matrix, (dict(enumerate(words)), dict(enumerate(offsets)))
+
+
+def read_document(filename, offset):
+    '''Read the single document stored at the given byte offset of a JSON
+    Lines file.'''
+    with open(filename, 'rb') as infile:
+        return read_document_from(infile, offset)
+
+
+def read_document_from(infile, offset):
+    '''Read the document at the given byte offset of a JSON Lines file that
+    is already open in binary mode.'''
+    infile.seek(offset)
+    return json.loads(infile.readline())
+
+
+# each backend is called as backend(matrix, k, workers=workers)
+SVD_BACKENDS = {
+    'power': lambda matrix, k, workers=None: svd(
+        matrix, k=k, gram_matrix=False, workers=workers),
+    'block': svd_block,
+    'randomized': randomized_svd,
+    'sparse': sparse_svd,
+}
+
+
+def choose_svd_backend(matrix, k):
+    '''Pick an SVD backend for a matrix based on its shape, density and the
+    number of singular values wanted.
+
+     - If k is a large fraction of min(n, m), or the matrix is small, use
+       block power iteration, which handles that well.
+     - Otherwise, if the matrix is sparse, use the sparse truncated solver,
+       which only touches the nonzero entries.
+     - Otherwise use the randomized solver, whose cost is dominated by a
+       few passes of dense matrix products.
+    '''
+    n, m = matrix.shape
+    density = matrix.nnz / (n * m) if issparse(matrix) else 1
+    if 2 * k >= min(n, m) or n * m <= 10 ** 6:
+        return 'block'
+    if density < 0.1:
+        return 'sparse'
+    return 'randomized'
+
+
+def cluster_document_term_matrix(matrix, k=10, svd_backend='power',
+                                 weighting='log-entropy', cache=None,
+                                 workers=None, restarts=4):
+    '''Cluster the words and documents of a document term matrix using a
+    simple SVD-based topic model.
+
+    Arguments:
+        matrix: a (dense or sparse) document term matrix
+        k: the number of singular values to compute
+        svd_backend: the name of an SVD implementation in SVD_BACKENDS, or
+            'auto' to choose one with choose_svd_backend.
+        weighting: the weighting scheme passed to normalize.
+        cache: a decomposition_cache.DecompositionCache. If given, the
+            normalized matrix and its SVD are looked up in the cache, and
+            computed and stored there if missing.
+        workers: the number of threads the SVD backend splits its matrix
+            products across, or None to use a single thread. The k-means
+            restarts also run on this many threads.
+        restarts: the number of k-means runs to keep the best of (see
+            cluster).
+
+    Returns:
+        A pair (word_clustering, document_clustering) of arrays, giving the
+        cluster label of each word (row) and each document (column).
+    '''
+    if svd_backend == 'auto':
+        svd_backend = choose_svd_backend(matrix, k)
+    if svd_backend not in SVD_BACKENDS:
+        raise ValueError("Unknown SVD backend {}, expected one of {}".format(
+            svd_backend, sorted(SVD_BACKENDS) + ['auto']))
+
+    cached = None
+    if cache is not None:
+        key = cache.key(matrix, k=k, svd_backend=svd_backend,
+                        weighting=weighting)
+        cached = cache.get(key)
+
+    if cached is None:
+        matrix = normalize(matrix, weighting=weighting)
+        sigma, U, V = SVD_BACKENDS[svd_backend](
+            matrix, k, workers=workers)
+        if cache is not None:
+            cache.put(key, matrix, (sigma, U, V))
+    else:
+        matrix, (sigma, U, V) = cached
+
+    projected_documents = matrix.T.dot(U)
+    projected_words = matrix.dot(V.T)
+
+    document_centers, document_clustering = cluster(
+        projected_documents, restarts=restarts, workers=workers)
+    word_centers, word_clustering = cluster(
+        projected_words, restarts=restarts, workers=workers)
+    return word_clustering, document_clustering
+
+
+def cluster_stories(documents, k=10, svd_backend='power',
+                    weighting='log-entropy', cache=None, workers=None,
+                    restarts=4):
     '''Cluster a set of documents using a simple SVD-based topic model.
 
     Arguments:
@@ -96,38 +439,185 @@ def cluster_stories(documents, k=10):
                 'text': string
             }
 
+            or a corpus.Corpus, which is passed on to cluster_corpus.
         k: the number of singular values to compute.
+        svd_backend, weighting, cache, workers, restarts: passed to
+            cluster_document_term_matrix.
 
     Returns:
         A pair of (word_clusters, document_clusters), where word_clusters
         is a clustering over the set of all words in all documents, and
         document_clustering is a clustering over the set of documents.
     '''
+    if isinstance(documents, Corpus):
+        return cluster_corpus(
+            documents, k=k, svd_backend=svd_backend, weighting=weighting,
+            cache=cache, workers=workers, restarts=restarts)
+
     matrix, (index_to_word, index_to_document) = make_document_term_matrix(
-        documents)
-    matrix = normalize(matrix)
-    sigma, U, V = svd(matrix, k=k)
+        documents, sparse=True)
+    word_clustering, document_clustering = cluster_document_term_matrix(
+        matrix, k=k, svd_backend=svd_backend, weighting=weighting,
+        cache=cache, workers=workers, restarts=restarts)
 
-    projected_documents = np.dot(matrix.T, U)
-    projected_words = np.dot(matrix, V.T)
+    word_clusters = group_by_label(
+        word_clustering, lambda i: index_to_word[i])
+    document_clusters = group_by_label(
+        document_clustering, lambda i: index_to_document[i]['text'])
 
-    document_centers, document_clustering = cluster(projected_documents)
-    word_centers, word_clustering = cluster(projected_words)
+    return word_clusters, document_clusters
 
-    word_clusters = tuple(
-        tuple(index_to_word[i]
-              for (i, x) in enumerate(word_clustering) if x == j)
-        for j in range(len(set(word_clustering)))
-    )
 
-    document_clusters = tuple(
-        tuple(index_to_document[i]['text']
-              for (i, x) in enumerate(document_clustering) if x == j)
-        for j in range(len(set(document_clustering)))
-    )
+def cluster_stories_from_file(filename='all_stories.jsonl', k=10,
+                              svd_backend='power', weighting='log-entropy',
+                              cache=None, workers=None, restarts=4):
+    '''Cluster the documents in a JSON Lines file, as in cluster_stories,
+    streaming the file instead of loading it into memory. The text of each
+    document is read back from the file only when building the output.
+    '''
+    matrix, (index_to_word, index_to_offset) = load_document_term_matrix(
+        filename)
+    word_clustering, document_clustering = cluster_document_term_matrix(
+        matrix, k=k, svd_backend=svd_backend, weighting=weighting,
+        cache=cache, workers=workers, restarts=restarts)
+
+    word_clusters = group_by_label(
+        word_clustering, lambda i: index_to_word[i])
+    with open(filename, 'rb') as infile:
+        document_clusters = group_by_label(
+            document_clustering,
+            lambda i: read_document_from(infile, index_to_offset[i])['text'])
 
     return word_clusters, document_clusters
 
 
+def cluster_corpus(corpus, k=10, svd_backend='power',
+                   weighting='log-entropy', cache=None, workers=None,
+                   restarts=4):
+    '''Cluster the documents of a corpus.Corpus, as in cluster_stories.
+    The document term matrix is built directly from the corpus's token ids,
+    and only the texts of the documents are decoded.
+    '''
+    matrix, index_to_word = corpus.document_term_matrix()
+    word_clustering, document_clustering = cluster_document_term_matrix(
+        matrix, k=k, svd_backend=svd_backend, weighting=weighting,
+        cache=cache, workers=workers, restarts=restarts)
+
+    word_clusters = group_by_label(
+        word_clustering, lambda i: index_to_word[i])
+    document_clusters = group_by_label(
+        document_clustering, lambda i: corpus.text(i))
+
+    return word_clusters, document_clusters
+
+
+class IncrementalTopicModel(object):
+    '''An SVD-based topic model that is updated as new documents arrive,
+    rather than recomputed from scratch.
+
+    New documents are folded in by projecting them onto the current left
+    singular vectors U. Every update_every documents, the pending documents
+    are appended to the decomposition with a rank-k incremental SVD.
+
+    The entropy-based global factors of normalize are computed from running
+    per-word totals (see entropy_global_factors), so they always reflect
+    every document seen so far. Documents already merged into the
+    decomposition are not re-weighted when the global factors change, so
+    the decomposition drifts from the one cluster_stories would compute;
+    rebuild the model from scratch periodically if that matters.
+    '''
+
+    def __init__(self, k=10, update_every=100):
+        self.k = k
+        self.update_every = update_every
+        self.word_to_index = dict()
+        self.index_to_word = []
+        self.num_documents = 0
+        self.row_sums = np.zeros(0)
+        self.count_entropy_sums = np.zeros(0)
+        self.singular_values = np.zeros(0)
+        self.U = np.zeros((0, 0))
+        self.pending_counts = []
+
+    def word_counts(self, document):
+        '''Return the nonzero entries (word indices, counts) of a document's
+        column in the document term matrix, ignoring unknown words.'''
+        counts = Counter(
+            word for word in document['words'] if word in self.word_to_index)
+        indices = np.array([self.word_to_index[w] for w in counts], dtype=int)
+        return indices, np.array(list(counts.values()), dtype=float)
+
+    def normalized_columns(self, column_counts):
+        '''Return the normalized document term matrix columns for a list of
+        (word indices, counts) pairs, as a dense matrix.'''
+        # The entropy normalization divides by log(num_documents), which is
+        # zero for the very first document.
+        global_factors = entropy_global_factors(
+            self.row_sums, self.count_entropy_sums, max(self.num_documents, 2))
+        columns = np.zeros((len(self.index_to_word), len(column_counts)))
+        for j, (indices, counts) in enumerate(column_counts):
+            columns[indices, j] = np.log1p(counts) * global_factors[indices]
+        return columns
+
+    def add_documents(self, documents):
+        '''Add new documents to the model.
+
+        Arguments:
+            documents: a list of dictionaries with a 'words' key, as in
+            cluster_stories.
+
+        Returns:
+            The projections of the new documents onto the current left
+            singular vectors, as a len(documents)-by-k matrix.
+        '''
+        for document in documents:
+            for word in document['words']:
+                if word not in self.word_to_index:
+                    self.word_to_index[word] = len(self.index_to_word)
+                    self.index_to_word.append(word)
+
+        num_new_words = len(self.index_to_word) - len(self.row_sums)
+        self.row_sums = np.append(self.row_sums, np.zeros(num_new_words))
+        self.count_entropy_sums = np.append(
+            self.count_entropy_sums, np.zeros(num_new_words))
+
+        column_counts = [self.word_counts(document) for document in documents]
+        for indices, counts in column_counts:
+            self.row_sums[indices] += counts
+            self.count_entropy_sums[indices] += counts * np.log(counts)
+        self.num_documents += len(documents)
+        self.pending_counts.extend(column_counts)
+
+        if len(self.pending_counts) >= self.update_every or not self.U.shape[1]:
+            self.update_decomposition()
+
+        return self.fold_in_counts(column_counts)
+
+    def fold_in(self, documents):
+        '''Project documents onto the current left singular vectors without
+        adding them to the model. Words not seen before are ignored.'''
+        return self.fold_in_counts(
+            [self.word_counts(document) for document in documents])
+
+    def fold_in_counts(self, column_counts):
+        return np.dot(self.normalized_columns(column_counts).T, self.padded_U())
+
+    def padded_U(self):
+        '''Return U with zero rows appended for words first seen after the
+        last update of the decomposition.'''
+        num_new_words = len(self.index_to_word) - len(self.U)
+        return np.vstack([self.U, np.zeros((num_new_words, self.U.shape[1]))])
+
+    def update_decomposition(self):
+        '''Merge all pending documents into the decomposition.'''
+        if not self.pending_counts:
+            return
+
+        self.singular_values, self.U = svd_update(
+            self.singular_values, self.padded_U(),
+            self.normalized_columns(self.pending_counts), k=self.k)
+        self.pending_counts = []
+
+
 if __name__ == "__main__":
     word_clusters, document_clusters = cluster_stories(load())
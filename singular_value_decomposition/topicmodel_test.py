@@ -1,10 +1,21 @@
 from assertpy import assert_that
+import json
 import numpy
+import os
 import random
+import scipy.sparse
+import tempfile
 
+from topicmodel import IncrementalTopicModel
 from topicmodel import all_words
+from topicmodel import choose_svd_backend
 from topicmodel import cluster_stories
+from topicmodel import cluster_stories_from_file
+from topicmodel import load_document_term_matrix
 from topicmodel import make_document_term_matrix
+from topicmodel import normalize
+from topicmodel import read_document
+from topicmodel import term_statistics
 
 EPSILON = 1e-9
 
@@ -71,6 +82,151 @@ def test_make_document_term_matrix():
         assert_that(a).is_close_to(b, EPSILON)
 
 
+def test_make_sparse_document_term_matrix():
+    doc1 = {
+        'words': ['b', 'c', 'a']
+    }
+    doc2 = {
+        'words': ['b', 'd', 'a', 'a']
+    }
+    doc3 = {
+        'words': ['b', 'd', 'e']
+    }
+    dense_matrix, _ = make_document_term_matrix([doc1, doc2, doc3])
+    sparse_matrix, (index_to_word, _) = make_document_term_matrix(
+        [doc1, doc2, doc3], sparse=True)
+    assert_that(index_to_word).is_equal_to(dict(enumerate('abcde')))
+    assert_that(sparse_matrix.nnz).is_equal_to(9)
+
+    flattened_actual = sparse_matrix.toarray().flatten()
+    flattened_expected = dense_matrix.flatten()
+    for (a, b) in zip(flattened_actual, flattened_expected):
+        assert_that(a).is_close_to(b, EPSILON)
+
+    flattened_actual = normalize(sparse_matrix).toarray().flatten()
+    flattened_expected = normalize(dense_matrix).flatten()
+    for (a, b) in zip(flattened_actual, flattened_expected):
+        assert_that(a).is_close_to(b, EPSILON)
+
+
+def test_load_document_term_matrix():
+    doc1 = {
+        'words': ['b', 'c', 'a'],
+        'text': 'doc1',
+    }
+    doc2 = {
+        'words': ['b', 'd', 'a', 'a'],
+        'text': 'doc2',
+    }
+    doc3 = {
+        'words': ['e', 'd', 'b'],
+        'text': 'doc3',
+    }
+    expected_matrix, _ = make_document_term_matrix([doc1, doc2, doc3])
+
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'stories.jsonl')
+    try:
+        with open(filename, 'w') as outfile:
+            for document in [doc1, doc2, doc3]:
+                outfile.write(json.dumps(document) + '\n')
+
+        matrix, (index_to_word, index_to_offset) = load_document_term_matrix(
+            filename)
+        assert_that(index_to_word).is_equal_to(dict(enumerate('abcde')))
+        assert_that(read_document(filename, index_to_offset[2])).is_equal_to(
+            doc3)
+    finally:
+        os.remove(filename)
+        os.rmdir(tmpdir)
+
+    flattened_actual = matrix.toarray().flatten()
+    flattened_expected = expected_matrix.flatten()
+    for (a, b) in zip(flattened_actual, flattened_expected):
+        assert_that(a).is_close_to(b, EPSILON)
+
+
+def test_cluster_stories_from_file():
+    documents = [
+        {'words': ['a', 'b', 'c', 'a'], 'text': 'doc1'},
+        {'words': ['b', 'c', 'a', 'b'], 'text': 'doc2'},
+        {'words': ['x', 'y', 'z', 'x'], 'text': 'doc3'},
+        {'words': ['y', 'z', 'x', 'z'], 'text': 'doc4'},
+    ]
+
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'stories.jsonl')
+    try:
+        with open(filename, 'w') as outfile:
+            for document in documents:
+                outfile.write(json.dumps(document) + '\n')
+
+        word_clusters, document_clusters = cluster_stories_from_file(
+            filename, k=2, svd_backend='block')
+    finally:
+        os.remove(filename)
+        os.rmdir(tmpdir)
+
+    assert_that(set(document_clusters)).contains_only(
+        ('doc1', 'doc2'), ('doc3', 'doc4'))
+
+
+def test_normalize_dense_matches_sparse():
+    matrix = numpy.array([
+        [1, 1, 0, 2],
+        [1, 3, 1, 0],
+        [2, 0, 0, 1],
+        [0, 1, 1, 1],
+    ], dtype='float64')
+
+    for weighting in ['log-entropy', 'tf-idf', 'bm25']:
+        dense = normalize(matrix, weighting=weighting, block_size=3)
+        sparse = normalize(scipy.sparse.csc_matrix(matrix), weighting=weighting)
+        for (a, b) in zip(dense.flatten(), sparse.toarray().flatten()):
+            assert_that(a).is_close_to(b, EPSILON)
+
+    # normalizing in place leaves the input unchanged unless asked not to
+    copy = matrix.copy()
+    normalize(copy)
+    assert_that(copy.tolist()).is_equal_to(matrix.tolist())
+    normalize(copy, in_place=True)
+    assert_that(copy.tolist()).is_equal_to(normalize(matrix).tolist())
+
+
+def test_term_statistics_sums_duplicate_entries():
+    # word 0 occurs twice in document 0 and once in document 1, and word 1
+    # twice in document 1, with the counts split over duplicate entries
+    matrix = scipy.sparse.coo_matrix(
+        (numpy.ones(5), ([0, 0, 0, 1, 1], [0, 0, 1, 1, 1])))
+    dense_statistics = term_statistics(matrix.toarray())
+    statistics = term_statistics(matrix)
+
+    assert_that(statistics.count_entropy_sums[0]).is_close_to(
+        2 * numpy.log(2), EPSILON)
+    for actual, expected in zip(statistics, dense_statistics):
+        assert_that(actual.tolist()).is_equal_to(expected.tolist())
+
+    for weighting in ['log-entropy', 'tf-idf', 'bm25']:
+        for (a, b) in zip(
+                normalize(matrix, weighting=weighting).toarray().flatten(),
+                normalize(matrix.toarray(), weighting=weighting).flatten()):
+            assert_that(a).is_close_to(b, EPSILON)
+
+
+def test_normalize_tf_idf():
+    matrix = numpy.array([
+        [1, 1],
+        [3, 0],
+    ], dtype='float64')
+    expected = numpy.array([
+        [0, 0],
+        [3 * numpy.log(2), 0],
+    ])
+    for (a, b) in zip(normalize(matrix, weighting='tf-idf').flatten(),
+                      expected.flatten()):
+        assert_that(a).is_close_to(b, EPSILON)
+
+
 def test_cluster_stories():
     random.seed(1)
     numpy.random.seed(1)
@@ -107,3 +263,58 @@ def test_cluster_stories():
     assert_that(set(document_clusters)).contains_only(
         ('doc1', 'doc2', 'doc6'),
         ('doc3', 'doc4', 'doc5'))
+
+    for svd_backend in ['power', 'block', 'randomized', 'sparse', 'auto']:
+        for workers in [None, 2]:
+            word_clusters, document_clusters = cluster_stories(
+                [doc1, doc2, doc3, doc4, doc5, doc6], k=2,
+                svd_backend=svd_backend, workers=workers)
+            assert_that(set(document_clusters)).contains_only(
+                ('doc1', 'doc2', 'doc6'),
+                ('doc3', 'doc4', 'doc5'))
+
+
+def test_choose_svd_backend():
+    assert_that(choose_svd_backend(numpy.zeros((50, 40)), k=5)).is_equal_to(
+        'block')
+    sparse_matrix = scipy.sparse.random(5000, 1000, density=0.01)
+    assert_that(choose_svd_backend(sparse_matrix, k=10)).is_equal_to('sparse')
+    assert_that(choose_svd_backend(sparse_matrix, k=600)).is_equal_to('block')
+
+
+def test_incremental_topic_model_matches_batch():
+    documents = [
+        {'words': ['b', 'c', 'a', 'd', 'e', 'c']},
+        {'words': ['b', 'd', 'a', 'e', 'e', 'c']},
+        {'words': ['x', 'y', 'z', 'x', 'y', 'w']},
+        {'words': ['w', 'y', 'z', 'y', 'z']},
+        {'words': ['z', 'w', 'z', 'w', 'w']},
+        {'words': ['c', 'c', 'a', 'e', 'e']},
+    ]
+    model = IncrementalTopicModel(k=2)
+    model.add_documents(documents)
+
+    matrix, _ = make_document_term_matrix(documents)
+    expected_singular_values = numpy.linalg.svd(
+        normalize(matrix), compute_uv=False)
+    for (a, b) in zip(model.singular_values, expected_singular_values[:2]):
+        assert_that(a).is_close_to(b, EPSILON)
+
+
+def test_incremental_topic_model_add_documents():
+    model = IncrementalTopicModel(k=2, update_every=2)
+    model.add_documents([
+        {'words': ['b', 'c', 'a', 'd', 'e', 'c']},
+        {'words': ['x', 'y', 'z', 'x', 'y', 'w']},
+    ])
+    model.add_documents([{'words': ['b', 'd', 'a', 'e', 'e', 'c']}])
+    assert_that(model.pending_counts).is_length(1)
+
+    projections = model.add_documents([{'words': ['w', 'y', 'z', 'q']}])
+    assert_that(model.pending_counts).is_empty()
+    assert_that(projections.shape).is_equal_to((1, 2))
+    assert_that(model.U.shape).is_equal_to((len(model.index_to_word), 2))
+
+    identity = numpy.dot(model.U.T, model.U)
+    for (a, b) in zip(identity.flatten(), numpy.eye(2).flatten()):
+        assert_that(a).is_close_to(b, EPSILON)